@@ -0,0 +1,122 @@
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import requests
+from fake_gitlab import OfflineCleaner
+
+FAKE_GITLAB = Path(__file__).resolve().parent / "fake_gitlab.py"
+
+
+class FakeGitLabProcess:
+    # The server runs in its own process so its allocations stay out of tracemalloc.
+    def __init__(self, projects: int, members: int, latency: float, rate_limit: int):
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                str(FAKE_GITLAB),
+                "--port",
+                "0",
+                "--projects",
+                str(projects),
+                "--members",
+                str(members),
+                "--latency",
+                str(latency),
+                "--rate_limit",
+                str(rate_limit),
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        self.url = self.process.stdout.readline().rsplit(" ", 1)[-1].strip()
+
+    def stats(self) -> Dict[str, int]:
+        return requests.get(f"{self.url}/_stats", timeout=10).json()
+
+    def close(self) -> None:
+        self.process.terminate()
+        self.process.wait()
+
+
+def measure(server: FakeGitLabProcess, call: Callable[[], Any]) -> Dict[str, float]:
+    before = server.stats()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = call()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    after = server.stats()
+    return {
+        "items": len(result),
+        "seconds": elapsed,
+        "peak": peak,
+        **{name: after[name] - before[name] for name in after},
+    }
+
+
+def run(size: int, args: argparse.Namespace, cache_directory: Path) -> List[Dict[str, Any]]:
+    server = FakeGitLabProcess(size, args.members, args.latency, args.rate_limit)
+    try:
+        cleaner = OfflineCleaner(
+            group_id="group",
+            base_directory=cache_directory,
+            gitlab_url=server.url,
+            api_workers=args.api_workers,
+            max_in_flight=args.api_workers,
+            rate_limit=args.client_rate,
+            cache_directory=cache_directory,
+        )
+        for member_id in range(1, args.members + 1):
+            (cache_directory / f"user-{member_id}").mkdir()
+        projects_url = f"{cleaner.group_api_url}/projects"
+        cases = (
+            ("get_json_response", lambda: cleaner.get_json_response(projects_url)),
+            ("get_group_repositories", cleaner.get_group_repositories),
+            ("get_group_repositories (etag)", cleaner.get_group_repositories),
+            ("get_user_directories", cleaner.get_user_directories),
+        )
+        return [{"size": size, "case": name, **measure(server, call)} for name, call in cases]
+    finally:
+        server.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure throughput and memory of the GitLab API layer against a local "
+        "fake GitLab server."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 50_000])
+    parser.add_argument("--members", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="Server seconds/request")
+    parser.add_argument("--rate_limit", type=int, default=0, help="Server requests/minute")
+    parser.add_argument("--client_rate", type=float, default=1000.0, help="--rate_limit")
+    parser.add_argument("--api_workers", type=int, default=8)
+    args = parser.parse_args()
+    os.environ.setdefault("GITLAB_TOKEN", "offline")
+    logging.basicConfig(level=logging.WARNING)
+
+    print(
+        f"{'projects':>9}  {'case':<31}{'items':>7}{'requests':>10}{'304s':>6}{'429s':>6}"
+        f"{'seconds':>9}{'items/s':>10}{'peak MiB':>10}"
+    )
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as cache_directory:
+            for row in run(size, args, Path(cache_directory)):
+                print(
+                    f"{row['size']:>9}  {row['case']:<31}{row['items']:>7}{row['requests']:>10}"
+                    f"{row['not_modified']:>6}{row['throttled']:>6}{row['seconds']:>9.2f}"
+                    f"{row['items'] / row['seconds']:>10.0f}{row['peak'] / 2**20:>10.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
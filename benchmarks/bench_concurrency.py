@@ -0,0 +1,100 @@
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_gitlab import OfflineCleaner
+
+import main as cleaner_module
+from main import CommandResult, ConcurrencyController, GitLabRepoCleaner
+
+
+class SimulatedServer:
+    # Serves `capacity` fetches at full speed; beyond that fetches slow down in proportion
+    # to the load, and beyond four times that they are refused like a rate-limited GitLab.
+    def __init__(self, capacity: int, latency: float):
+        self.capacity = capacity
+        self.latency = latency
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def fetch(self) -> CommandResult:
+        with self._lock:
+            self.in_flight += 1
+            load = self.in_flight
+        try:
+            if load > 4 * self.capacity:
+                time.sleep(self.latency / 10)
+                return CommandResult(128, "", "remote: Too Many Requests\n")
+            time.sleep(self.latency * max(1.0, load / self.capacity))
+            return CommandResult(0, "", "")
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def run(cleaner: GitLabRepoCleaner, server: SimulatedServer, repos: int, workers: int) -> float:
+    def update(repo_id: int) -> bool:
+        repo_path = Path(f"repo-{repo_id}")
+        controller = cleaner.concurrency
+        started = controller.acquire() if controller is not None else time.monotonic()
+        result = server.fetch()
+        if controller is not None:
+            controller.release(
+                started, *cleaner._network_outcome(repo_path, "fetch", result, started)
+            )
+        return result.returncode == 0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        failed = repos - sum(executor.map(update, range(repos)))
+    elapsed = time.perf_counter() - started
+    print(f"  {(repos - failed) / elapsed:8.1f} fetches/s, {failed:>5} refused", end="")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Simulated fetch throughput of fixed and adaptive concurrency."
+    )
+    parser.add_argument("--repos", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per fetch")
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--max_jobs", type=int, default=64)
+    parser.add_argument(
+        "--capacities", type=int, nargs="+", default=[3, 40], help="Fetches served at speed"
+    )
+    args = parser.parse_args()
+    os.environ.setdefault("GITLAB_TOKEN", "offline")
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix="bench-concurrency-") as base:
+        cleaner = OfflineCleaner(group_id="group", base_directory=Path(base), use_cache=False)
+        # The jitter allowance is meant for real fetches and is scaled down with them.
+        cleaner_module.LATENCY_SLACK = args.latency / 10
+        for capacity in args.capacities:
+            server = SimulatedServer(capacity, args.latency)
+            print(f"server capacity {capacity}:")
+            print(f"  fixed --jobs {args.jobs:<3}", end="")
+            cleaner.concurrency = None
+            run(cleaner, server, args.repos, args.jobs)
+            print()
+            print(f"  --max_jobs {args.max_jobs:<5}", end="")
+            # Every repository starts from its uncontended fetch time, as after earlier runs.
+            cleaner.network_latencies = {
+                (f"repo-{repo_id}", "fetch"): args.latency for repo_id in range(args.repos)
+            }
+            cleaner.concurrency = ConcurrencyController(args.jobs, args.max_jobs)
+            run(cleaner, server, args.repos, args.max_jobs)
+            print(f", {cleaner.concurrency.report()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from main import GitRepoScanner
+
+
+def build_tree(root: Path, repos: int, files: int, namespaces: int) -> None:
+    # Each repository gets a .git directory plus a working tree spread over nested
+    # source, node_modules and build directories.
+    for repo_id in range(repos):
+        repo = (
+            root / f"subgroup-{repo_id % namespaces}" / f"team-{repo_id % 7}" / f"repo-{repo_id}"
+        )
+        (repo / ".git" / "objects").mkdir(parents=True)
+        (repo / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+        for file_id in range(files):
+            directory = repo / ("src", "node_modules", "build")[file_id % 3] / f"d{file_id % 50}"
+            if file_id < 150:
+                directory.mkdir(parents=True, exist_ok=True)
+            (directory / f"f{file_id}").touch()
+
+
+def os_walk_discovery(root: Path) -> List[str]:
+    # The find_local_git_repos loop this engine replaced.
+    repos = []
+    for current, dirs, _ in os.walk(root):
+        if os.path.isdir(os.path.join(current, ".git")):
+            repos.append(current)
+            dirs[:] = [d for d in dirs if d != ".git"]
+    return repos
+
+
+def scandir_discovery(root: Path) -> List[str]:
+    return list(GitRepoScanner(root).scan())
+
+
+def timed(call: Callable[[Path], List[str]], root: Path) -> float:
+    started = time.perf_counter()
+    found = call(root)
+    elapsed = time.perf_counter() - started
+    print(f"  {call.__name__:<20}{len(found):>8} repos{elapsed:>10.3f}s")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare os.walk and GitRepoScanner repository discovery."
+    )
+    parser.add_argument("--repos", type=int, default=1000)
+    parser.add_argument("--files", type=int, default=1000, help="Files per repository")
+    parser.add_argument("--namespaces", type=int, default=20)
+    parser.add_argument("--root", type=Path, help="Reuse (or keep) the tree at this path")
+    args = parser.parse_args()
+
+    root = args.root or Path(tempfile.mkdtemp(prefix="bench-discovery-"))
+    try:
+        if not root.exists() or not any(root.iterdir()):
+            print(f"Building {args.repos} repos x {args.files} files in {root}...")
+            root.mkdir(parents=True, exist_ok=True)
+            build_tree(root, args.repos, args.files, args.namespaces)
+        walk = timed(os_walk_discovery, root)
+        scan = timed(scandir_discovery, root)
+        print(f"  speedup: {walk / scan:.1f}x")
+    finally:
+        if args.root is None:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import logging
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Callable, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_gitlab import OfflineCleaner
+
+from main import GitLabRepoCleaner
+
+
+def measure(cleaner: GitLabRepoCleaner, call: Callable[[], object]) -> Dict[str, float]:
+    received = {"wire_bytes": 0, "body_bytes": 0, "requests": 0}
+
+    def count(response, *args, **kwargs):
+        # Hooks run before requests reads the body, so it is read here as it came over the
+        # wire, still compressed, and decoded into the response for the caller.
+        wire = response.raw.read(decode_content=False)
+        encoding = response.headers.get("Content-Encoding", "")
+        response._content = (
+            zlib.decompress(wire, 47) if encoding in ("gzip", "deflate") else wire
+        )
+        received["wire_bytes"] += len(wire)
+        received["body_bytes"] += len(response.content)
+        received["requests"] += 1
+
+    # Encodings zlib can decode; GitLab answers these listings gzip-compressed.
+    cleaner.session.headers["Accept-Encoding"] = "gzip, deflate"
+    cleaner.session.hooks["response"] = [count]
+    started = time.perf_counter()
+    result = call()
+    elapsed = time.perf_counter() - started
+    return {"items": len(result), "seconds": elapsed, **received}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare bytes transferred and wall time of the REST and GraphQL "
+        "backends for the project and member listings. Needs GITLAB_TOKEN."
+    )
+    parser.add_argument("--group_id", required=True, help="GitLab group full path")
+    parser.add_argument("--gitlab_url", default="https://gitlab.com")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    print(
+        f"{'backend':<10}{'listing':<10}{'items':>8}{'requests':>10}{'wire KiB':>12}"
+        f"{'body KiB':>12}{'seconds':>10}"
+    )
+    for backend in ("rest", "graphql"):
+        cleaner = OfflineCleaner(
+            group_id=args.group_id,
+            gitlab_url=args.gitlab_url,
+            base_directory=Path.cwd(),
+            use_cache=False,
+            api_backend=backend,
+        )
+        members_url = f"{cleaner.group_api_url}/members"
+        listings = (
+            ("projects", cleaner.get_group_repositories),
+            ("members", lambda: list(cleaner._iter_member_usernames(members_url))),
+        )
+        for name, call in listings:
+            result = measure(cleaner, call)
+            print(
+                f"{backend:<10}{name:<10}{result['items']:>8}{result['requests']:>10}"
+                f"{result['wire_bytes'] / 1024:>12.1f}{result['body_bytes'] / 1024:>12.1f}"
+                f"{result['seconds']:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Set
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_gitlab import OfflineCleaner
+
+from main import ProjectRecord
+
+
+def project_paths(projects: int, subgroups: int) -> List[str]:
+    return [
+        f"group/subgroup-{project_id % subgroups}/team-{project_id % 7}/repo-{project_id}"
+        for project_id in range(projects)
+    ]
+
+
+def resolve_diff(
+    base: Path, local_git_repos: Dict[str, Path], remote_paths: List[str]
+) -> List[Path]:
+    # The resolve() mapping and per-repository comparison this diff replaced.
+    remote: Set[Path] = {(base / Path(path)).resolve() for path in remote_paths}
+    return [path for path in local_git_repos.values() if path not in remote]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time the remote/local repository diff on a synthetic group."
+    )
+    parser.add_argument("--projects", type=int, default=100_000)
+    parser.add_argument("--subgroups", type=int, default=50)
+    parser.add_argument(
+        "--removed_subgroups", type=int, default=1, help="Subgroups deleted on GitLab"
+    )
+    args = parser.parse_args()
+    os.environ.setdefault("GITLAB_TOKEN", "offline")
+    logging.disable(logging.INFO)
+
+    base = Path(tempfile.mkdtemp(prefix="bench-path-diff-")).resolve()
+    try:
+        cleaner = OfflineCleaner(group_id="group", base_directory=base, use_cache=False)
+        local_paths = project_paths(args.projects, args.subgroups)
+        removed = tuple(f"group/subgroup-{i}/" for i in range(args.removed_subgroups))
+        remote_paths = [path for path in local_paths if not path.startswith(removed)]
+        gitlab_repositories = {
+            path: ProjectRecord(i, path, "", "main", "", False, False)
+            for i, path in enumerate(remote_paths)
+        }
+        local_git_repos = {path: base / path for path in local_paths}
+        # Only the removed subgroups exist on disk; they are what the diff looks at.
+        for path in local_paths:
+            if path.startswith(removed):
+                (base / path / ".git").mkdir(parents=True)
+        print(f"{len(local_git_repos)} local repositories, {len(gitlab_repositories)} on GitLab")
+
+        started = time.perf_counter()
+        orphans = resolve_diff(base, local_git_repos, remote_paths)
+        elapsed = time.perf_counter() - started
+        print(f"  {'resolve + per-repo':<22}{len(orphans):>8} deletions{elapsed:>10.3f}s")
+
+        started = time.perf_counter()
+        orphans = cleaner.identify_repos_to_delete(local_git_repos, gitlab_repositories)
+        elapsed = time.perf_counter() - started
+        print(f"  {'lexical trie':<22}{len(orphans):>8} deletions{elapsed:>10.3f}s")
+    finally:
+        shutil.rmtree(base)
+
+
+if __name__ == "__main__":
+    main()
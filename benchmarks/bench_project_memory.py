@@ -0,0 +1,53 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_gitlab import full_project
+
+from main import PER_PAGE, ProjectRecord
+
+
+def pages(total: int) -> Iterator[bytes]:
+    for start in range(1, total + 1, PER_PAGE):
+        stop = min(start + PER_PAGE, total + 1)
+        yield json.dumps([full_project(i) for i in range(start, stop)]).encode()
+
+
+def measure(total: int, parse: Callable[[Dict], Any]) -> Dict[str, float]:
+    tracemalloc.start()
+    started = time.perf_counter()
+    results: List[Any] = []
+    for body in pages(total):
+        results.extend(parse(item) for item in json.loads(body))
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"items": len(results), "retained": current, "peak": peak, "seconds": elapsed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare memory held by raw project JSON and ProjectRecord listings."
+    )
+    parser.add_argument("--projects", type=int, default=50_000)
+    args = parser.parse_args()
+
+    raw = measure(args.projects, lambda project: project)
+    compact = measure(args.projects, ProjectRecord.from_json)
+    print(f"{'representation':<16}{'retained MiB':>14}{'peak MiB':>12}{'seconds':>10}")
+    for name, result in (("raw dict", raw), ("ProjectRecord", compact)):
+        print(
+            f"{name:<16}{result['retained'] / 2**20:>14.1f}"
+            f"{result['peak'] / 2**20:>12.1f}{result['seconds']:>10.2f}"
+        )
+    print(f"peak reduction: {raw['peak'] / compact['peak']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_gitlab import OfflineCleaner
+
+from main import GitLabRepoCleaner
+
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "bench",
+    "GIT_AUTHOR_EMAIL": "bench@example.com",
+    "GIT_COMMITTER_NAME": "bench",
+    "GIT_COMMITTER_EMAIL": "bench@example.com",
+}
+
+
+class ForkCounter:
+    # Counts every process subprocess starts while installed.
+    def __init__(self) -> None:
+        self.forks = 0
+        self.popen = subprocess.Popen
+
+    def __enter__(self) -> "ForkCounter":
+        counter = self
+
+        class CountingPopen(self.popen):
+            def __init__(self, *args, **kwargs):
+                counter.forks += 1
+                super().__init__(*args, **kwargs)
+
+        subprocess.Popen = CountingPopen
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        subprocess.Popen = self.popen
+
+
+def build_repo(path: Path, branches: int) -> None:
+    # A clone-like layout: a checked out feature branch, origin/HEAD and most refs packed.
+    def git(*args: str) -> None:
+        subprocess.run(["git", *args], cwd=path, check=True, capture_output=True)
+
+    path.mkdir(parents=True)
+    git("init", "-q", "-b", "main")
+    git("commit", "-q", "--allow-empty", "-m", "init")
+    for branch_id in range(branches):
+        git("branch", f"topic-{branch_id}")
+    git("update-ref", "refs/remotes/origin/main", "HEAD")
+    git("symbolic-ref", "refs/remotes/origin/HEAD", "refs/remotes/origin/main")
+    git("pack-refs", "--all")
+    git("checkout", "-q", "-b", "feature")
+
+
+def subprocess_queries(cleaner: GitLabRepoCleaner, repo: Path) -> None:
+    # The git calls update_git_repo made for these queries before the reader.
+    output: List[str] = []
+    cleaner._run_git(repo, ["branch", "--show-current"], output)
+    cleaner._run_git(repo, ["rev-parse", "--abbrev-ref", "origin/HEAD"], output)
+    for ref in ("refs/heads/main", "refs/remotes/origin/main", "refs/heads/main"):
+        cleaner._run_git(repo, ["rev-parse", "--verify", "--quiet", ref], output, False)
+
+
+def reader_queries(cleaner: GitLabRepoCleaner, repo: Path) -> None:
+    output: List[str] = []
+    cleaner._current_branch(repo, output)
+    cleaner.get_default_branch(repo, output)
+    for ref in ("refs/heads/main", "refs/remotes/origin/main", "refs/heads/main"):
+        cleaner._ref_head(repo, ref, output)
+
+
+def measure(
+    call: Callable[[GitLabRepoCleaner, Path], None],
+    cleaner: GitLabRepoCleaner,
+    repos: List[Path],
+) -> None:
+    with ForkCounter() as counter:
+        started = time.perf_counter()
+        for repo in repos:
+            call(cleaner, repo)
+        elapsed = time.perf_counter() - started
+    print(
+        f"  {call.__name__:<20}{counter.forks / len(repos):>6.1f} forks/repo"
+        f"{elapsed * 1000 / len(repos):>10.2f} ms/repo"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Count git processes per repository for the update queries."
+    )
+    parser.add_argument("--repos", type=int, default=50)
+    parser.add_argument("--branches", type=int, default=200, help="Packed refs per repository")
+    args = parser.parse_args()
+    os.environ.update(GIT_ENV)
+    os.environ.setdefault("GITLAB_TOKEN", "offline")
+    logging.disable(logging.INFO)
+
+    base = Path(tempfile.mkdtemp(prefix="bench-ref-reader-")).resolve()
+    try:
+        cleaner = OfflineCleaner(group_id="group", base_directory=base, use_cache=False)
+        repos = [base / "group" / f"repo-{repo_id}" for repo_id in range(args.repos)]
+        for repo in repos:
+            build_repo(repo, args.branches)
+        print(f"{args.repos} repositories with {args.branches} packed branches each")
+        measure(subprocess_queries, cleaner, repos)
+        measure(reader_queries, cleaner, repos)
+    finally:
+        shutil.rmtree(base)
+
+
+if __name__ == "__main__":
+    main()
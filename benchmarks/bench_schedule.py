@@ -0,0 +1,101 @@
+import argparse
+import heapq
+import logging
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_gitlab import OfflineCleaner
+
+from main import GitLabRepoCleaner
+
+# Bytes of pack file per second of update for repositories without a recorded duration.
+PACK_BYTES_PER_SECOND = 1 << 20
+
+
+def simulate(order: List[Path], durations: Dict[Path, float], workers: int) -> Dict[Path, float]:
+    # Workers take the next repository as soon as they are free, like ThreadPoolExecutor.
+    # Returns when each repository finished.
+    free_at = [0.0] * workers
+    finished = {}
+    for path in order:
+        finished[path] = heapq.heappop(free_at) + durations[path]
+        heapq.heappush(free_at, finished[path])
+    return finished
+
+
+def build_fixtures(
+    cleaner: GitLabRepoCleaner, base: Path, repos: int, new_share: float, seed: int
+) -> Tuple[List[Path], Dict[Path, float], List[Path]]:
+    # Most fetches are quick; a few large repositories take minutes (Pareto tail). Recorded
+    # durations are the true ones with run-to-run noise; new clones only have a pack file.
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    paths, durations, changed = [], {}, []
+    for repo_id in range(repos):
+        path = base / "group" / f"repo-{repo_id}"
+        duration = min(0.5 * rng.paretovariate(1.2), 600.0)
+        if rng.random() < new_share:
+            pack_dir = path / ".git" / "objects" / "pack"
+            pack_dir.mkdir(parents=True)
+            with open(pack_dir / "pack-0.pack", "wb") as pack:
+                pack.truncate(int(duration * PACK_BYTES_PER_SECOND))
+        else:
+            cleaner.previous_durations[str(path)] = duration * rng.lognormvariate(0, 0.3)
+        # Activity is independent of size; projects active in the last day have changes.
+        active_at = now - timedelta(hours=rng.expovariate(1 / 72))
+        cleaner.last_activity_at[str(path)] = active_at.strftime("%Y-%m-%dT%H:%M:%SZ")
+        if now - active_at < timedelta(days=1):
+            changed.append(path)
+        paths.append(path)
+        durations[path] = duration
+    return paths, durations, changed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Simulated wall time of an update run for each --schedule order."
+    )
+    parser.add_argument("--repos", type=int, default=1500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument(
+        "--new_share", type=float, default=0.1, help="Share of repositories never updated"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    os.environ.setdefault("GITLAB_TOKEN", "offline")
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory(prefix="bench-schedule-") as base:
+        cleaner = OfflineCleaner(group_id="group", base_directory=Path(base), use_cache=False)
+        paths, durations, changed = build_fixtures(
+            cleaner, Path(base), args.repos, args.new_share, args.seed
+        )
+        total = sum(durations.values())
+        print(
+            f"{args.repos} repositories, {total:.0f}s of work in total, "
+            f"{len(changed)} active in the last day"
+        )
+        orders = {}
+        for schedule in ("discovery", "activity", "longest"):
+            cleaner.schedule = schedule
+            orders[schedule] = cleaner.schedule_repos(list(paths))
+        for workers in args.workers:
+            ideal = max(total / workers, max(durations.values()))
+            print(f"  {workers:>3} workers, lower bound {ideal:8.1f}s")
+            for schedule, order in orders.items():
+                finished = simulate(order, durations, workers)
+                print(
+                    f"      {schedule:<10} wall time {max(finished.values()):8.1f}s"
+                    f"  active repositories done after {max(finished[p] for p in changed):8.1f}s"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from main import GitRepoScanner
+
+
+def build_tree(root: Path, repos: int, namespaces: int) -> None:
+    for repo_id in range(repos):
+        namespace = root / f"subgroup-{repo_id % namespaces}" / f"team-{repo_id % 5}"
+        (namespace / f"repo-{repo_id}" / ".git").mkdir(parents=True)
+        (namespace / f"repo-{repo_id}" / "src").mkdir()
+
+
+def slowed(call: Callable[..., Any], latency: float) -> Callable[..., Any]:
+    # time.sleep releases the GIL like a blocking NFS round trip does.
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        time.sleep(latency)
+        return call(*args, **kwargs)
+
+    return wrapper
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure GitRepoScanner on a filesystem whose stat and readdir calls "
+        "are delayed to mimic a network mount."
+    )
+    parser.add_argument("--repos", type=int, default=500)
+    parser.add_argument("--namespaces", type=int, default=20)
+    parser.add_argument("--latency_ms", type=float, default=2.0, help="Delay per metadata call")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16, 32])
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="bench-slow-fs-"))
+    try:
+        build_tree(root, args.repos, args.namespaces)
+        latency = args.latency_ms / 1000
+        os.stat = slowed(os.stat, latency)
+        os.scandir = slowed(os.scandir, latency)
+        baseline = None
+        print(f"{args.repos} repos, {args.latency_ms} ms per stat/readdir")
+        for workers in args.workers:
+            started = time.perf_counter()
+            found = sum(1 for _ in GitRepoScanner(root, workers=workers).scan())
+            elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            print(
+                f"  workers={workers:<4}{found:>6} repos{elapsed:>9.2f}s"
+                f"{baseline / elapsed:>8.1f}x"
+            )
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+import argparse
+import bisect
+import hashlib
+import json
+import math
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from main import GitLabRepoCleaner
+
+# GitLab stops reporting X-Total/X-Total-Pages above this many rows.
+TOTALS_LIMIT = 10_000
+MAX_PER_PAGE = 100
+SIMPLE_PROJECT_FIELDS = (
+    "id",
+    "description",
+    "name",
+    "name_with_namespace",
+    "path",
+    "path_with_namespace",
+    "created_at",
+    "default_branch",
+    "tag_list",
+    "topics",
+    "ssh_url_to_repo",
+    "http_url_to_repo",
+    "web_url",
+    "readme_url",
+    "forks_count",
+    "avatar_url",
+    "star_count",
+    "last_activity_at",
+    "namespace",
+)
+
+
+def last_activity_at(project_id: int) -> str:
+    return f"2026-{project_id % 12 + 1:02d}-01T08:09:10.000Z"
+
+
+def full_project(project_id: int, group: str = "group") -> Dict[str, Any]:
+    namespace = f"{group}/subgroup-{project_id % 97}"
+    path = f"project-{project_id}"
+    web_url = f"https://gitlab.example.com/{namespace}/{path}"
+    api_url = f"https://gitlab.example.com/api/v4/projects/{project_id}"
+    return {
+        "id": project_id,
+        "description": f"Synthetic project {project_id} used to measure listing memory.",
+        "name": path,
+        "name_with_namespace": f"Group / Subgroup {project_id % 97} / {path}",
+        "path": path,
+        "path_with_namespace": f"{namespace}/{path}",
+        "created_at": "2023-05-04T10:11:12.000Z",
+        "default_branch": "main",
+        "tag_list": [],
+        "topics": ["backend", "service"],
+        "ssh_url_to_repo": f"git@gitlab.example.com:{namespace}/{path}.git",
+        "http_url_to_repo": f"{web_url}.git",
+        "web_url": web_url,
+        "readme_url": f"{web_url}/-/blob/main/README.md",
+        "avatar_url": None,
+        "forks_count": 0,
+        "star_count": project_id % 5,
+        "last_activity_at": last_activity_at(project_id),
+        "namespace": {
+            "id": 1000 + project_id % 97,
+            "name": f"Subgroup {project_id % 97}",
+            "path": f"subgroup-{project_id % 97}",
+            "kind": "group",
+            "full_path": namespace,
+            "parent_id": 1000,
+            "avatar_url": None,
+            "web_url": f"https://gitlab.example.com/groups/{namespace}",
+        },
+        "_links": {
+            "self": api_url,
+            "issues": f"{api_url}/issues",
+            "merge_requests": f"{api_url}/merge_requests",
+            "repo_branches": f"{api_url}/repository/branches",
+            "labels": f"{api_url}/labels",
+            "events": f"{api_url}/events",
+            "members": f"{api_url}/members",
+        },
+        "packages_enabled": True,
+        "empty_repo": False,
+        "archived": project_id % 50 == 0,
+        "visibility": "private",
+        "resolve_outdated_diff_discussions": False,
+        "container_registry_enabled": True,
+        "issues_enabled": True,
+        "merge_requests_enabled": True,
+        "wiki_enabled": True,
+        "jobs_enabled": True,
+        "snippets_enabled": True,
+        "service_desk_enabled": False,
+        "can_create_merge_request_in": True,
+        "issues_access_level": "enabled",
+        "repository_access_level": "enabled",
+        "merge_requests_access_level": "enabled",
+        "wiki_access_level": "enabled",
+        "builds_access_level": "enabled",
+        "shared_runners_enabled": True,
+        "creator_id": 42,
+        "import_status": "none",
+        "open_issues_count": project_id % 13,
+        "ci_default_git_depth": 20,
+        "public_jobs": True,
+        "build_timeout": 3600,
+        "auto_cancel_pending_pipelines": "enabled",
+        "ci_config_path": "",
+        "shared_with_groups": [],
+        "only_allow_merge_if_pipeline_succeeds": False,
+        "request_access_enabled": True,
+        "only_allow_merge_if_all_discussions_are_resolved": False,
+        "remove_source_branch_after_merge": True,
+        "printing_merge_request_link_enabled": True,
+        "merge_method": "merge",
+        "squash_option": "default_off",
+        "auto_devops_enabled": False,
+        "permissions": {
+            "project_access": None,
+            "group_access": {"access_level": 30, "notification_level": 3},
+        },
+    }
+
+
+def member(member_id: int) -> Dict[str, Any]:
+    return {
+        "id": member_id,
+        "username": f"user-{member_id}",
+        "name": f"User {member_id}",
+        "state": "active",
+        "avatar_url": None,
+        "web_url": f"https://gitlab.example.com/user-{member_id}",
+        "access_level": 30,
+        "created_at": "2023-05-04T10:11:12.000Z",
+        "expires_at": None,
+    }
+
+
+class FakeGitLab:
+    def __init__(
+        self,
+        group: str = "group",
+        projects: int = 1000,
+        members: int = 100,
+        latency: float = 0.0,
+        rate_limit: int = 0,
+        rate_window: float = 60.0,
+    ):
+        self.group = group
+        self.projects = projects
+        self.members = members
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.requests = 0
+        self.throttled = 0
+        self.not_modified = 0
+        self._window_start = time.time()
+        self._window_requests = 0
+        self._lock = threading.Lock()
+
+    def check_rate_limit(self) -> Tuple[bool, Dict[str, str]]:
+        with self._lock:
+            self.requests += 1
+            if not self.rate_limit:
+                return True, {}
+            now = time.time()
+            if now - self._window_start >= self.rate_window:
+                self._window_start = now
+                self._window_requests = 0
+            self._window_requests += 1
+            reset = self._window_start + self.rate_window
+            remaining = max(self.rate_limit - self._window_requests, 0)
+            headers = {
+                "RateLimit-Limit": str(self.rate_limit),
+                "RateLimit-Remaining": str(remaining),
+                "RateLimit-Reset": str(math.ceil(reset)),
+            }
+            if self._window_requests > self.rate_limit:
+                self.throttled += 1
+                headers["Retry-After"] = str(max(math.ceil(reset - now), 1))
+                return False, headers
+            return True, headers
+
+    def project(self, project_id: int, simple: bool) -> Dict[str, Any]:
+        project = full_project(project_id, self.group)
+        if simple:
+            return {field: project[field] for field in SIMPLE_PROJECT_FIELDS}
+        return project
+
+    def list_projects(
+        self, base_url: str, params: Dict[str, str]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        per_page = min(int(params.get("per_page", 20)), MAX_PER_PAGE)
+        simple = params.get("simple", "").lower() == "true"
+        ids = list(range(1, self.projects + 1))
+        if params.get("archived", "").lower() == "false":
+            ids = [i for i in ids if i % 50 != 0]
+        if "last_activity_after" in params:
+            after = params["last_activity_after"]
+            ids = [i for i in ids if last_activity_at(i) > after]
+        if params.get("pagination") == "keyset":
+            start = bisect.bisect_right(ids, int(params.get("id_after", 0)))
+            end = start + per_page
+            page_ids = ids[start:end]
+            headers = {}
+            if page_ids and page_ids[-1] != ids[-1]:
+                next_params = {**params, "id_after": str(page_ids[-1])}
+                headers["Link"] = f'<{base_url}?{urlencode(next_params)}>; rel="next"'
+            return [self.project(i, simple) for i in page_ids], headers
+        return self.paginate(ids, params, per_page, lambda i: self.project(i, simple))
+
+    def list_members(
+        self, params: Dict[str, str]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        per_page = min(int(params.get("per_page", 20)), MAX_PER_PAGE)
+        return self.paginate(list(range(1, self.members + 1)), params, per_page, member)
+
+    @staticmethod
+    def paginate(
+        ids: List[int], params: Dict[str, str], per_page: int, build: Any
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        page = int(params.get("page", 1))
+        total_pages = max(1, -(-len(ids) // per_page))
+        headers = {
+            "X-Page": str(page),
+            "X-Per-Page": str(per_page),
+            "X-Next-Page": str(page + 1) if page < total_pages else "",
+            "X-Prev-Page": str(page - 1) if page > 1 else "",
+        }
+        if len(ids) <= TOTALS_LIMIT:
+            headers["X-Total"] = str(len(ids))
+            headers["X-Total-Pages"] = str(total_pages)
+        start = (page - 1) * per_page
+        end = start + per_page
+        return [build(i) for i in ids[start:end]], headers
+
+    def graphql(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        if variables.get("fullPath") != self.group:
+            return {"data": {"group": None}}
+        offset = int(variables.get("after") or 0)
+        if "groupMembers" in query:
+            total, connection = self.members, "groupMembers"
+            nodes = [
+                {"user": {"username": member(i)["username"]}}
+                for i in range(offset + 1, min(offset + MAX_PER_PAGE, total) + 1)
+            ]
+        else:
+            total, connection = self.projects, "projects"
+            nodes = []
+            for i in range(offset + 1, min(offset + MAX_PER_PAGE, total) + 1):
+                project = full_project(i, self.group)
+                nodes.append(
+                    {
+                        "id": f"gid://gitlab/Project/{i}",
+                        "fullPath": project["path_with_namespace"],
+                        "httpUrlToRepo": project["http_url_to_repo"],
+                        "archived": project["archived"],
+                        "lastActivityAt": project["last_activity_at"],
+                        "repository": {"rootRef": "main", "empty": False},
+                    }
+                )
+        end = offset + len(nodes)
+        page_info = {"hasNextPage": end < total, "endCursor": str(end)}
+        return {"data": {"group": {connection: {"pageInfo": page_info, "nodes": nodes}}}}
+
+
+class FakeGitLabHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeGitLabServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        gitlab = self.server.gitlab
+        if self.path == "/_stats":
+            stats = {
+                "requests": gitlab.requests,
+                "throttled": gitlab.throttled,
+                "not_modified": gitlab.not_modified,
+            }
+            self._send(200, stats, {})
+            return
+        allowed, headers = self._admit()
+        if not allowed:
+            return
+        parsed = urlparse(self.path)
+        params = dict(parse_qsl(parsed.query))
+        group_prefix = f"/api/v4/groups/{gitlab.group.replace('/', '%2F')}/"
+        if parsed.path == f"{group_prefix}projects":
+            base_url = f"http://{self.headers['Host']}{parsed.path}"
+            body, page_headers = gitlab.list_projects(base_url, params)
+        elif parsed.path == f"{group_prefix}members":
+            body, page_headers = gitlab.list_members(params)
+        else:
+            self._send(404, {"message": "404 Not Found"}, headers)
+            return
+        headers.update(page_headers)
+        payload = json.dumps(body).encode()
+        etag = f'W/"{hashlib.md5(payload).hexdigest()}"'
+        headers["ETag"] = etag
+        if self.headers.get("If-None-Match") == etag:
+            with gitlab._lock:
+                gitlab.not_modified += 1
+            self._send_raw(304, b"", headers)
+            return
+        self._send_raw(200, payload, headers)
+
+    def do_POST(self) -> None:
+        # Read the body first so a rejected request does not desync the keep-alive stream.
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        allowed, headers = self._admit()
+        if not allowed:
+            return
+        if urlparse(self.path).path != "/api/graphql":
+            self._send(404, {"message": "404 Not Found"}, headers)
+            return
+        request = json.loads(body)
+        result = self.server.gitlab.graphql(request["query"], request.get("variables") or {})
+        self._send(200, result, headers)
+
+    def _admit(self) -> Tuple[bool, Dict[str, str]]:
+        gitlab = self.server.gitlab
+        if gitlab.latency:
+            time.sleep(gitlab.latency)
+        allowed, headers = gitlab.check_rate_limit()
+        if not allowed:
+            self._send(429, {"message": "429 Too Many Requests"}, headers)
+        return allowed, headers
+
+    def _send(self, status: int, body: Any, headers: Dict[str, str]) -> None:
+        self._send_raw(status, json.dumps(body).encode(), headers)
+
+    def _send_raw(self, status: int, payload: bytes, headers: Dict[str, str]) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class FakeGitLabServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, gitlab: FakeGitLab, port: int = 0):
+        super().__init__(("127.0.0.1", port), FakeGitLabHandler)
+        self.gitlab = gitlab
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def start(self) -> "FakeGitLabServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class OfflineCleaner(GitLabRepoCleaner):
+    def _check_dependencies(self) -> None:
+        pass
+
+
+def start_fake_gitlab(**kwargs: Any) -> FakeGitLabServer:
+    return FakeGitLabServer(FakeGitLab(**kwargs)).start()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Serve a synthetic GitLab group for offline runs of main.py."
+    )
+    parser.add_argument("--group", default="group")
+    parser.add_argument("--projects", type=int, default=1000)
+    parser.add_argument("--members", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per request")
+    parser.add_argument(
+        "--rate_limit", type=int, default=0, help="Requests per window before 429 (0: off)"
+    )
+    parser.add_argument("--rate_window", type=float, default=60.0)
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args(argv)
+    gitlab = FakeGitLab(
+        group=args.group,
+        projects=args.projects,
+        members=args.members,
+        latency=args.latency,
+        rate_limit=args.rate_limit,
+        rate_window=args.rate_window,
+    )
+    server = FakeGitLabServer(gitlab, args.port)
+    print(
+        f"Serving group '{args.group}' with {args.projects} projects on {server.url}",
+        flush=True,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,1292 @@
 import argparse
+import asyncio
+import ctypes
+import errno
+import hashlib
+import itertools
+import json
 import logging
+import mmap
 import os
+import random
+import select
 import shutil
+import signal
+import socket
+import sqlite3
+import struct
 import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Set
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+from urllib.parse import quote
 
 import requests
-from requests import Session
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+
+PER_PAGE = 100
+KEYSET_THRESHOLD = 10_000
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+CACHED_RESPONSE_HEADERS = ("X-Total", "X-Total-Pages", "X-Next-Page", "Link")
+# GitLab throttles last_activity_at updates, so the delta cursor overlaps the previous run.
+ACTIVITY_CURSOR_OVERLAP = timedelta(hours=1)
+GRAPHQL_PROJECTS_QUERY = """
+query($fullPath: ID!, $after: String) {
+  group(fullPath: $fullPath) {
+    projects(includeSubgroups: true, first: 100, after: $after) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        id
+        fullPath
+        httpUrlToRepo
+        archived
+        lastActivityAt
+        repository { rootRef empty }
+      }
+    }
+  }
+}
+"""
+GRAPHQL_MEMBERS_QUERY = """
+query($fullPath: ID!, $after: String) {
+  group(fullPath: $fullPath) {
+    groupMembers(relations: [DIRECT], first: 100, after: $after) {
+      pageInfo { hasNextPage endCursor }
+      nodes { user { username } }
+    }
+  }
+}
+"""
+# Extra namespace levels scanned below the deepest GitLab path, so repositories of a
+# removed, deeper subgroup are still found and reported.
+DISCOVERY_DEPTH_MARGIN = 1
+# First byte of a peeled-tag line in packed-refs.
+PACKED_REFS_PEELED = ord("^")
+# inotify(7) constants; namespace directories are watched for entries appearing or vanishing.
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+NAMESPACE_WATCH_MASK = (
+    IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_ONLYDIR
+)
+INOTIFY_EVENT = struct.Struct("iIII")
+# A watcher whose heartbeat is older than this many intervals is treated as gone.
+WATCHER_STALE_INTERVALS = 3
+# Repository updates are mostly network wait, but each one is a fetch against GitLab.
+DEFAULT_UPDATE_JOBS = min(8, os.cpu_count() or 1)
+# Keeps ssh from prompting for a passphrase or host key nobody answers.
+BATCH_SSH_COMMAND = "ssh -o BatchMode=yes"
+# Seconds a command gets to exit after SIGTERM before it is killed with SIGKILL.
+KILL_GRACE_PERIOD = 5.0
+# Seconds between checks whether a command has exited while its pipes are still open, and
+# for reading what is left in them once it has.
+EXIT_POLL_INTERVAL = 0.5
+PIPE_DRAIN_TIMEOUT = 1.0
+# git operations that talk to GitLab; --max_jobs adapts how many of them run at once.
+NETWORK_GIT_OPERATIONS = ("fetch", "ls-remote")
+# Lowercased stderr fragments of a server or network refusing more work.
+OVERLOAD_MARKERS = (
+    "too many requests",
+    "returned error: 429",
+    "returned error: 502",
+    "returned error: 503",
+    "returned error: 504",
+    "rate limit",
+    "connection reset",
+    "connection timed out",
+    "connection refused",
+    "connection closed by",
+    "kex_exchange_identification",
+    "ssh_exchange_identification",
+    "hung up unexpectedly",
+    "early eof",
+)
+# A network operation slower than this many times its usual latency for the repository
+# counts as a latency spike; above the lower ratio it counts as slow, below it as steady.
+LATENCY_SPIKE_RATIO = 3.0
+LATENCY_STEADY_RATIO = 1.5
+# Absorbs the jitter of very short operations in the ratios above, in seconds.
+LATENCY_SLACK = 1.0
+# Weight of the newest latency in the moving average kept per repository and operation.
+LATENCY_EWMA_WEIGHT = 0.3
+DEFAULT_CACHE_DIRECTORY = (
+    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "repo-sync-manager"
+)
 
 
 class GitLabAPIError(Exception):
     pass
 
 
+class RepoUpdateResult(NamedTuple):
+    path: Path
+    status: str  # "updated", "unchanged", "skipped", "timed out" or "failed"
+    duration: float
+    output: str
+    error: Optional[str]
+
+
+class ProjectRecord(NamedTuple):
+    id: int
+    path_with_namespace: str
+    http_url_to_repo: str
+    default_branch: Optional[str]
+    last_activity_at: Optional[str]
+    archived: bool
+    empty_repo: bool
+
+    @classmethod
+    def from_json(cls, project: Dict) -> "ProjectRecord":
+        # simple=true payloads omit archived/empty_repo; server-side filters cover those.
+        return cls(
+            project["id"],
+            project["path_with_namespace"],
+            project["http_url_to_repo"],
+            project.get("default_branch"),
+            project.get("last_activity_at"),
+            project.get("archived", False),
+            project.get("empty_repo", False),
+        )
+
+    @classmethod
+    def from_graphql(cls, node: Dict) -> "ProjectRecord":
+        repository = node.get("repository") or {}
+        return cls(
+            int(node["id"].rsplit("/", 1)[-1]),
+            node["fullPath"],
+            node["httpUrlToRepo"],
+            repository.get("rootRef"),
+            node.get("lastActivityAt"),
+            node.get("archived", False),
+            repository.get("empty", False),
+        )
+
+
+class RequestScheduler:
+    def __init__(
+        self,
+        session: Session,
+        max_rate: float = 10.0,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        timeout: float = 60.0,
+        max_in_flight: int = 8,
+    ):
+        self.session = session
+        self.max_rate = max(max_rate, 0.1)
+        self.rate = self.max_rate
+        self.burst = max(1.0, self.max_rate)
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(max(1, max_in_flight))
+
+    def get(self, url: str, **kwargs) -> Response:
+        return self.request("GET", url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> Response:
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            self._acquire()
+            try:
+                with self._in_flight:
+                    response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    logging.error(f"Giving up on {url} after {attempt + 1} attempts: {e}")
+                    raise GitLabAPIError(f"Cannot reach {url}: {e}")
+                delay = self._backoff_delay(attempt)
+                logging.warning(f"{e.__class__.__name__} for {url}, retrying in {delay:.1f}s")
+            else:
+                self._observe(response)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_after(response)
+                if delay is None:
+                    delay = self._backoff_delay(attempt)
+                else:
+                    self._pause(delay)
+                logging.warning(
+                    f"Error {response.status_code} while accessing {url}, "
+                    f"retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})"
+                )
+            time.sleep(delay)
+            attempt += 1
+
+    def _acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def _pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _observe(self, response: Response) -> None:
+        remaining = self._float_header(response, "RateLimit-Remaining")
+        reset = self._float_header(response, "RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        window = reset - time.time()
+        if window <= 0:
+            return
+        if remaining < 1:
+            logging.warning(f"Rate limit exhausted, pausing requests for {window:.1f}s")
+            self._pause(window)
+            return
+        # Spread the remaining quota evenly over the rest of the window.
+        with self._lock:
+            self.rate = max(0.1, min(self.max_rate, remaining / window))
+
+    def _retry_after(self, response: Response) -> Optional[float]:
+        retry_after = self._float_header(response, "Retry-After")
+        if retry_after is None and response.status_code == 429:
+            reset = self._float_header(response, "RateLimit-Reset")
+            if reset is not None:
+                retry_after = max(reset - time.time(), 0.0)
+        return retry_after
+
+    def _backoff_delay(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.backoff * 2**attempt)
+        return random.uniform(delay / 2, delay)
+
+    @staticmethod
+    def _float_header(response: Response, name: str) -> Optional[float]:
+        try:
+            return float(response.headers[name])
+        except (KeyError, ValueError):
+            return None
+
+
+class ResponseCache:
+    def __init__(self, directory: Path, ttl: float):
+        self.directory = directory
+        self.ttl = ttl
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._prune()
+
+    def _prune(self) -> None:
+        expired_before = time.time() - self.ttl
+        for path in self.directory.glob("*.json"):
+            try:
+                if path.stat().st_mtime < expired_before:
+                    path.unlink()
+            except OSError:
+                continue
+
+    def _entry_path(self, url: str, params: Optional[Dict]) -> Path:
+        params = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        key = hashlib.sha256(json.dumps([url, params]).encode()).hexdigest()
+        return self.directory / f"{key}.json"
+
+    def load(self, url: str, params: Optional[Dict]) -> Optional[Dict[str, Any]]:
+        path = self._entry_path(url, params)
+        try:
+            entry = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("stored_at", 0) > self.ttl:
+            path.unlink(missing_ok=True)
+            return None
+        return entry
+
+    def store(self, url: str, params: Optional[Dict], response: Response, body: Any) -> None:
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        entry = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": time.time(),
+            "headers": {
+                name: response.headers[name]
+                for name in CACHED_RESPONSE_HEADERS
+                if name in response.headers
+            },
+            "body": body,
+        }
+        self._write(self._entry_path(url, params), entry)
+
+    def refresh(self, url: str, params: Optional[Dict], entry: Dict[str, Any]) -> None:
+        entry["stored_at"] = time.time()
+        self._write(self._entry_path(url, params), entry)
+
+    @staticmethod
+    def _write(path: Path, entry: Dict[str, Any]) -> None:
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_text(json.dumps(entry))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Cannot write API cache entry {path}: {e}")
+
+    @staticmethod
+    def conditional_headers(entry: Dict[str, Any]) -> Dict[str, str]:
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+
+class GitRepoScanner:
+    def __init__(self, root: Path, max_depth: Optional[int] = None, workers: int = 1):
+        self.root = root
+        self.max_depth = max_depth
+        self.workers = max(1, workers)
+        self.namespaces: Dict[str, int] = {}
+
+    @staticmethod
+    def is_repo_root(path: str) -> bool:
+        return os.path.isdir(os.path.join(path, ".git"))
+
+    @staticmethod
+    def list_subdirectories(directory: str) -> Tuple[int, List[str]]:
+        # The mtime is read first so a change made during the listing is seen next run.
+        mtime_ns = os.stat(directory).st_mtime_ns
+        with os.scandir(directory) as entries:
+            children = [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)]
+        return mtime_ns, children
+
+    @classmethod
+    def list_namespace(cls, directory: str) -> Optional[Tuple[int, List[str], List[str]]]:
+        # Children of a namespace are either repository roots, which are reported and never
+        # entered, or nested namespaces; working tree contents are never listed.
+        try:
+            mtime_ns, children = cls.list_subdirectories(directory)
+        except OSError as e:
+            logging.warning(f"Cannot scan {directory}: {e}")
+            return None
+        repos, namespaces = [], []
+        for child in children:
+            (repos if cls.is_repo_root(child) else namespaces).append(child)
+        return mtime_ns, repos, namespaces
+
+    def _within_depth(self, depth: int) -> bool:
+        return self.max_depth is None or depth <= self.max_depth
+
+    def scan(self) -> Iterator[str]:
+        if self.workers > 1:
+            yield from self._scan_parallel()
+            return
+        root = str(self.root)
+        if self.is_repo_root(root):
+            yield root
+            return
+        stack = [(root, 0)]
+        while stack:
+            directory, depth = stack.pop()
+            listing = self.list_namespace(directory)
+            if listing is None:
+                continue
+            mtime_ns, repos, namespaces = listing
+            self.namespaces[directory] = mtime_ns
+            yield from repos
+            if self._within_depth(depth + 2):
+                stack.extend((namespace, depth + 1) for namespace in namespaces)
+
+    def _probe(self, directory: str) -> Optional[Tuple[int, List[str]]]:
+        # None marks a repository root; otherwise the namespace mtime and subdirectories.
+        if self.is_repo_root(directory):
+            return None
+        try:
+            return self.list_subdirectories(directory)
+        except OSError as e:
+            logging.warning(f"Cannot scan {directory}: {e}")
+            return 0, []
+
+    def _scan_parallel(self) -> Iterator[str]:
+        # Every directory is probed in its own task, so the stat and readdir round trips of a
+        # slow (e.g. NFS) mount overlap; repositories are yielded as soon as they are found.
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {executor.submit(self._probe, str(self.root)): (str(self.root), 0)}
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        directory, depth = pending.pop(future)
+                        result = future.result()
+                        if result is None:
+                            yield directory
+                            continue
+                        mtime_ns, children = result
+                        self.namespaces[directory] = mtime_ns
+                        if self._within_depth(depth + 1):
+                            for child in children:
+                                pending[executor.submit(self._probe, child)] = (child, depth + 1)
+            finally:
+                for future in pending:
+                    future.cancel()
+
+
+class NamespaceTrie:
+    # Paths known to GitLab, one node per path component. A node is a namespace when it has
+    # children and a project when is_project is set; nested projects make it both.
+    __slots__ = ("children", "is_project")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "NamespaceTrie"] = {}
+        self.is_project = False
+
+    @staticmethod
+    def split(path: str) -> List[str]:
+        # Purely lexical: separators, "." and ".." are normalised without touching the
+        # filesystem, so thousands of remote paths cost no syscalls.
+        return [part for part in os.path.normpath(path).split(os.sep) if part != "."]
+
+    @classmethod
+    def from_paths(cls, paths: Iterable[str]) -> "NamespaceTrie":
+        root = cls()
+        for path in paths:
+            node = root
+            for part in cls.split(path):
+                child = node.children.get(part)
+                if child is None:
+                    child = node.children[part] = cls()
+                node = child
+            node.is_project = True
+        return root
+
+    def match(self, parts: List[str]) -> Tuple[int, Optional["NamespaceTrie"]]:
+        # Number of leading parts found in the trie, and the node of the full path if found.
+        node = self
+        for depth, part in enumerate(parts):
+            child = node.children.get(part)
+            if child is None:
+                return depth, None
+            node = child
+        return len(parts), node
+
+
+class RepoIndex:
+    def __init__(self, path: Path, root: Path, workers: int = 1):
+        self.root = str(root)
+        self.workers = max(1, workers)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(path))
+        # WAL lets sync runs read the index while a watcher process is writing to it.
+        self.connection.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS namespaces (
+                path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS namespaces_parent ON namespaces (parent);
+            CREATE TABLE IF NOT EXISTS repos (path TEXT PRIMARY KEY, namespace TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS repos_namespace ON repos (namespace);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS projects (
+                path TEXT PRIMARY KEY, default_branch TEXT, last_activity_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS update_durations (
+                path TEXT PRIMARY KEY, seconds REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS network_latencies (
+                path TEXT NOT NULL, operation TEXT NOT NULL, seconds REAL NOT NULL,
+                PRIMARY KEY (path, operation)
+            );
+            """
+        )
+
+    def refresh(self, rescan: bool = False) -> List[str]:
+        if not rescan and self.is_live():
+            logging.info("Repository index: kept up to date by a running watcher.")
+            return self._verified_repos()
+        with self.connection:
+            namespaces = dict(self.connection.execute("SELECT path, mtime_ns FROM namespaces"))
+            if rescan or self.root not in namespaces:
+                self.connection.execute("DELETE FROM namespaces")
+                self.connection.execute("DELETE FROM repos")
+                self._scan_subtree(self.root, None)
+            else:
+                changed = 0
+                paths = sorted(namespaces)
+                if self.workers > 1:
+                    with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                        mtimes = list(executor.map(self._mtime_ns, paths))
+                else:
+                    mtimes = [self._mtime_ns(path) for path in paths]
+                # Sorted order visits parents first, so subtrees they drop are skipped.
+                for namespace, mtime_ns in zip(paths, mtimes):
+                    if mtime_ns != namespaces[namespace] and self._is_indexed(namespace):
+                        changed += 1
+                        self._rescan_namespace(namespace)
+                logging.info(f"Repository index: rescanned {changed} changed namespaces.")
+        return self._verified_repos()
+
+    def repos(self) -> List[str]:
+        return [path for (path,) in self.connection.execute("SELECT path FROM repos")]
+
+    def namespaces(self) -> Dict[str, int]:
+        return dict(self.connection.execute("SELECT path, mtime_ns FROM namespaces"))
+
+    def rescan_namespaces(self, namespaces: Iterable[str]) -> None:
+        with self.connection:
+            for namespace in sorted(namespaces):
+                if self._is_indexed(namespace):
+                    self._rescan_namespace(namespace)
+
+    def projects(self) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        # Local path -> (default_branch, last_activity_at) from the last GitLab listing.
+        query = "SELECT path, default_branch, last_activity_at FROM projects"
+        return {
+            path: (branch, activity) for path, branch, activity in self.connection.execute(query)
+        }
+
+    def store_projects(
+        self, projects: Iterable[Tuple[str, Optional[str], Optional[str]]]
+    ) -> None:
+        # Kept apart from repos, which namespace rescans rewrite; replaced on every listing.
+        with self.connection:
+            self.connection.execute("DELETE FROM projects")
+            self.connection.executemany("INSERT INTO projects VALUES (?, ?, ?)", projects)
+
+    def update_durations(self) -> Dict[str, float]:
+        return dict(self.connection.execute("SELECT path, seconds FROM update_durations"))
+
+    def store_update_durations(self, durations: Dict[str, float]) -> None:
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO update_durations VALUES (?, ?)", durations.items()
+            )
+
+    def network_latencies(self) -> Dict[Tuple[str, str], float]:
+        query = "SELECT path, operation, seconds FROM network_latencies"
+        return {
+            (path, operation): seconds
+            for path, operation, seconds in self.connection.execute(query)
+        }
+
+    def store_network_latencies(self, latencies: Dict[Tuple[str, str], float]) -> None:
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO network_latencies VALUES (?, ?, ?)",
+                ((path, operation, seconds) for (path, operation), seconds in latencies.items()),
+            )
+
+    def get_watcher(self) -> Optional[Dict[str, Any]]:
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'watcher'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_watcher(self, watcher: Optional[Dict[str, Any]]) -> None:
+        with self.connection:
+            if watcher is None:
+                self.connection.execute("DELETE FROM meta WHERE key = 'watcher'")
+            else:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('watcher', ?)", (json.dumps(watcher),)
+                )
+
+    def get_concurrency(self) -> Optional[int]:
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'concurrency'"
+        ).fetchone()
+        return int(row[0]) if row else None
+
+    def set_concurrency(self, level: int) -> None:
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('concurrency', ?)", (str(level),)
+            )
+
+    def is_live(self) -> bool:
+        watcher = self.get_watcher()
+        if watcher is None or watcher["host"] != socket.gethostname():
+            return False
+        if time.time() - watcher["heartbeat"] > WATCHER_STALE_INTERVALS * watcher["interval"]:
+            return False
+        try:
+            os.kill(watcher["pid"], 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    @staticmethod
+    def _mtime_ns(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _verified_repos(self) -> List[str]:
+        # Removing a .git directory changes no namespace mtime, so every indexed repository
+        # is checked (one stat each) before it is reported: a plain directory taken for a
+        # repository could be deleted. The namespace of a stale one is rescanned.
+        rows = list(self.connection.execute("SELECT path, namespace FROM repos"))
+        paths = [path for path, _ in rows]
+        if self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                present = list(executor.map(GitRepoScanner.is_repo_root, paths))
+        else:
+            present = [GitRepoScanner.is_repo_root(path) for path in paths]
+        stale = [row for row, is_repo in zip(rows, present) if not is_repo]
+        if not stale:
+            return paths
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM repos WHERE path = ?", ((path,) for path, _ in stale)
+            )
+            for namespace in sorted({namespace for _, namespace in stale}):
+                if self._is_indexed(namespace):
+                    self._rescan_namespace(namespace)
+        logging.info(f"Repository index: dropped {len(stale)} directories without .git.")
+        return self.repos()
+
+    def _is_indexed(self, namespace: str) -> bool:
+        query = "SELECT 1 FROM namespaces WHERE path = ?"
+        return self.connection.execute(query, (namespace,)).fetchone() is not None
+
+    def _scan_subtree(self, namespace: str, parent: Optional[str]) -> None:
+        scanner = GitRepoScanner(Path(namespace), workers=self.workers)
+        repos = list(scanner.scan())
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO namespaces VALUES (?, ?, ?)",
+            (
+                (path, parent if path == namespace else os.path.dirname(path), mtime_ns)
+                for path, mtime_ns in scanner.namespaces.items()
+            ),
+        )
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO repos VALUES (?, ?)",
+            ((repo, os.path.dirname(repo)) for repo in repos),
+        )
+
+    def _rescan_namespace(self, namespace: str) -> None:
+        listing = GitRepoScanner.list_namespace(namespace)
+        if listing is None or GitRepoScanner.is_repo_root(namespace):
+            (parent,) = self.connection.execute(
+                "SELECT parent FROM namespaces WHERE path = ?", (namespace,)
+            ).fetchone()
+            self._drop_subtree(namespace)
+            if listing is not None:
+                self._scan_subtree(namespace, parent)
+            return
+        mtime_ns, repos, children = listing
+        self.connection.execute("DELETE FROM repos WHERE namespace = ?", (namespace,))
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO repos VALUES (?, ?)", ((repo, namespace) for repo in repos)
+        )
+        known = {
+            path
+            for (path,) in self.connection.execute(
+                "SELECT path FROM namespaces WHERE parent = ?", (namespace,)
+            )
+        }
+        for removed in known - set(children):
+            self._drop_subtree(removed)
+        for added in set(children) - known:
+            self._scan_subtree(added, namespace)
+        self.connection.execute(
+            "UPDATE namespaces SET mtime_ns = ? WHERE path = ?", (mtime_ns, namespace)
+        )
+
+    def _drop_subtree(self, namespace: str) -> None:
+        prefix = namespace + os.sep
+        for table in ("namespaces", "repos"):
+            self.connection.execute(
+                f"DELETE FROM {table} WHERE path = ? OR substr(path, 1, ?) = ?",
+                (namespace, len(prefix), prefix),
+            )
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class RepoIndexWatcher:
+    # Keeps a RepoIndex current from inotify events on its namespace directories and marks it
+    # live, so sync runs read it without checking every namespace mtime. When inotify is not
+    # available or the watch limit is exhausted, the index is refreshed by mtime instead.
+    def __init__(self, index: RepoIndex, interval: float = 30.0):
+        self.index = index
+        self.interval = interval
+        self.libc: Optional[ctypes.CDLL] = None
+        self.fd = -1
+        self.watches: Dict[int, str] = {}
+        self.watched: Dict[str, int] = {}
+
+    def run(self, rescan: bool = False) -> None:
+        self.index.refresh(rescan=rescan)
+        try:
+            try:
+                self._open()
+                self._sync_watches()
+                self._mark_live()
+                logging.info(f"Watching {len(self.watched)} namespace directories.")
+                self._watch_events()
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    reason = "inotify watch limit reached (see fs.inotify.max_user_watches)"
+                else:
+                    reason = f"inotify unavailable: {e}"
+                logging.warning(
+                    f"{reason}; refreshing the index by mtime every {self.interval:g}s instead."
+                )
+                self.index.set_watcher(None)
+                self._close()
+                self._poll()
+        finally:
+            self.index.set_watcher(None)
+            self._close()
+
+    def _open(self) -> None:
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            self._raise_errno()
+
+    def _close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+        self.fd = -1
+        self.watches.clear()
+        self.watched.clear()
+
+    @staticmethod
+    def _raise_errno(path: Optional[str] = None) -> None:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err), path)
+
+    def _mark_live(self) -> None:
+        watcher = {
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+            "heartbeat": time.time(),
+            "interval": self.interval,
+        }
+        self.index.set_watcher(watcher)
+
+    def _poll(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            self.index.refresh()
+
+    def _add_watch(self, path: str) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), NAMESPACE_WATCH_MASK)
+        if wd < 0:
+            if ctypes.get_errno() in (errno.ENOENT, errno.ENOTDIR):
+                # Already gone; the event on its parent drops it from the index.
+                return
+            self._raise_errno(path)
+        self.watches[wd] = path
+        self.watched[path] = wd
+
+    def _sync_watches(self) -> None:
+        # Namespaces are listed before their watch exists, so a new one that changed in
+        # between is rescanned and the check repeated until nothing was missed.
+        while True:
+            namespaces = self.index.namespaces()
+            for path in set(self.watched) - set(namespaces):
+                wd = self.watched.pop(path)
+                self.watches.pop(wd, None)
+                self.libc.inotify_rm_watch(self.fd, wd)
+            added = [path for path in namespaces if path not in self.watched]
+            for path in added:
+                self._add_watch(path)
+            missed = [path for path in added if RepoIndex._mtime_ns(path) != namespaces[path]]
+            if not missed:
+                return
+            self.index.rescan_namespaces(missed)
+
+    def _read_events(self) -> Iterator[Tuple[int, int]]:
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size + name_length
+            yield wd, mask
+
+    def _watch_events(self) -> None:
+        while True:
+            ready, _, _ = select.select([self.fd], [], [], self.interval)
+            if ready:
+                changed: Set[str] = set()
+                overflow = False
+                for wd, mask in self._read_events():
+                    if mask & IN_Q_OVERFLOW:
+                        overflow = True
+                    elif mask & IN_IGNORED:
+                        path = self.watches.pop(wd, None)
+                        if path is not None and self.watched.get(path) == wd:
+                            del self.watched[path]
+                    elif wd in self.watches:
+                        changed.add(self.watches[wd])
+                if overflow:
+                    logging.warning("inotify event queue overflowed; checking namespace mtimes.")
+                    self.index.refresh()
+                else:
+                    self.index.rescan_namespaces(changed)
+                if self.index.root not in self.index.namespaces():
+                    logging.warning(f"{self.index.root} is gone; stopping the watcher.")
+                    return
+                self._sync_watches()
+            self._mark_live()
+
+
+class GitRefReader:
+    # Answers ref and config queries from the files under .git, so they need no git
+    # process. open() returns None for layouts it does not read (a .git file as used by
+    # worktrees and submodules, linked worktree metadata, reftable); callers then use git.
+    def __init__(self, git_dir: str):
+        self.git_dir = git_dir
+        self._config: Optional[Dict[str, str]] = None
+
+    @classmethod
+    def open(cls, repo_path: Path) -> Optional["GitRefReader"]:
+        git_dir = os.path.join(repo_path, ".git")
+        if not os.path.isdir(git_dir) or os.path.exists(os.path.join(git_dir, "commondir")):
+            return None
+        reader = cls(git_dir)
+        if reader.config_value("extensions", "refstorage") not in (None, "files"):
+            return None
+        return reader
+
+    def config_value(
+        self, section: str, key: str, subsection: Optional[str] = None
+    ) -> Optional[str]:
+        if self._config is None:
+            self._config = self._parse_config(os.path.join(self.git_dir, "config"))
+        name = (
+            f"{section.lower()}.{subsection}.{key.lower()}"
+            if subsection
+            else f"{section.lower()}.{key.lower()}"
+        )
+        return self._config.get(name)
+
+    @staticmethod
+    def _parse_config(path: str) -> Dict[str, str]:
+        # Enough of git-config(1) for plain keys: [section] and [section "subsection"]
+        # headers, key = value lines, comments and quoted values. The last value wins.
+        values: Dict[str, str] = {}
+        section = ""
+        try:
+            with open(path, encoding="utf-8", errors="replace") as file:
+                lines = file.readlines()
+        except OSError:
+            return values
+        for line in lines:
+            line = line.strip()
+            if not line or line[0] in "#;":
+                continue
+            if line.startswith("["):
+                header = line[1:].partition("]")[0]
+                name, _, subsection = header.partition(" ")
+                subsection = subsection.strip().strip('"')
+                section = f"{name.lower()}.{subsection}" if subsection else name.lower()
+                continue
+            key, _, value = line.partition("=")
+            value = value.strip()
+            if value.startswith('"'):
+                value = value[1:].split('"', 1)[0]
+            else:
+                value = value.split(" #", 1)[0].split(" ;", 1)[0].strip()
+            values[f"{section}.{key.strip().lower()}"] = value if _ else "true"
+        return values
+
+    def head(self) -> Optional[str]:
+        # The symbolic ref HEAD points to, or the commit for a detached HEAD.
+        return self._read_loose("HEAD")
+
+    def current_branch(self) -> str:
+        head = self.head() or ""
+        return (
+            head.removeprefix("ref: refs/heads/") if head.startswith("ref: refs/heads/") else ""
+        )
+
+    def symbolic_target(self, ref: str) -> Optional[str]:
+        value = self._read_loose(ref)
+        return value.removeprefix("ref: ") if value and value.startswith("ref: ") else None
+
+    def resolve(self, ref: str) -> Optional[str]:
+        for _ in range(5):
+            value = self._read_loose(ref)
+            if value is None:
+                return self._read_packed(ref)
+            if not value.startswith("ref: "):
+                return value
+            ref = value.removeprefix("ref: ")
+        return None
+
+    def _read_loose(self, ref: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.git_dir, ref), encoding="utf-8") as file:
+                return file.readline().strip() or None
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            return None
+
+    def _read_packed(self, ref: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.git_dir, "packed-refs"), "rb") as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    return None
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return self._search_packed(data, ref.encode())
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _search_packed(data: mmap.mmap, ref: bytes) -> Optional[str]:
+        # Lines are "<sha> <ref>", each possibly followed by a "^<sha>" peeled line. Git
+        # writes them sorted by ref (the "sorted" trait), which allows a binary search.
+        start = 0
+        if data[:1] == b"#":
+            start = data.find(b"\n") + 1
+            if b" sorted" not in data[:start]:
+                for line in data[start:].splitlines():
+                    sha, _, name = line.partition(b" ")
+                    if name == ref:
+                        return sha.decode()
+                return None
+        low, high = start, len(data)
+        while low < high:
+            middle = (low + high) // 2
+            line_start = data.rfind(b"\n", low, middle) + 1 or low
+            if line_start < len(data) and data[line_start] == PACKED_REFS_PEELED:
+                line_start = data.rfind(b"\n", low, line_start - 1) + 1 or low
+            line_end = data.find(b"\n", line_start)
+            if line_end < 0:
+                line_end = len(data)
+            sha, _, name = data[line_start:line_end].partition(b" ")
+            if name == ref:
+                return sha.decode()
+            if name < ref:
+                low = line_end + 1
+                if low < len(data) and data[low] == PACKED_REFS_PEELED:
+                    peeled_end = data.find(b"\n", low)
+                    low = len(data) if peeled_end < 0 else peeled_end + 1
+            else:
+                high = line_start
+        return None
+
+
+class CommandStalled(subprocess.TimeoutExpired):
+    # Raised when the watchdog kills a command whose output stopped progressing.
+    def __str__(self) -> str:
+        return f"Command '{self.cmd}' made no progress for {self.timeout:g} seconds"
+
+
+class CommandResult(NamedTuple):
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+class CommandEngine:
+    # Runs commands as asyncio subprocesses on one background event loop, so many processes
+    # need no thread each. A global semaphore bounds the processes running at once and
+    # commands chained on the same key (a repository) run one after another. Coroutines on
+    # the loop await run_async(); threads call the blocking run() facade.
+    def __init__(self, max_processes: int, env: Optional[Dict[str, str]] = None):
+        self.max_processes = max(1, max_processes)
+        self.env = env
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        # Created on the loop thread and only touched there.
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._chains: Dict[str, asyncio.Lock] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._cancelled = False
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name="command-engine", daemon=True
+                ).start()
+            return self._loop
+
+    def run(
+        self,
+        cmd: List[str],
+        cwd: Optional[Path] = None,
+        chain: Optional[str] = None,
+        capture: bool = True,
+        timeout: Optional[float] = None,
+        stall_timeout: Optional[float] = None,
+        env: Optional[Dict[str, str]] = None,
+    ) -> CommandResult:
+        future = asyncio.run_coroutine_threadsafe(
+            self.run_async(cmd, cwd, chain, capture, timeout, stall_timeout, env), self.loop
+        )
+        try:
+            return future.result()
+        except KeyboardInterrupt:
+            self.cancel_all()
+            raise
+
+    async def run_async(
+        self,
+        cmd: List[str],
+        cwd: Optional[Path] = None,
+        chain: Optional[str] = None,
+        capture: bool = True,
+        timeout: Optional[float] = None,
+        stall_timeout: Optional[float] = None,
+        env: Optional[Dict[str, str]] = None,
+    ) -> CommandResult:
+        # timeout bounds the whole command; stall_timeout (captured output only) kills it
+        # once stdout and stderr have been silent that long. Both raise TimeoutExpired.
+        # env replaces the engine's environment for this command.
+        if self._cancelled:
+            raise asyncio.CancelledError()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_processes)
+        task = asyncio.current_task()
+        if task is not None:
+            self._tasks.add(task)
+        chain_lock = self._chains.setdefault(chain, asyncio.Lock()) if chain else None
+        try:
+            if chain_lock is not None:
+                await chain_lock.acquire()
+            try:
+                async with self._semaphore:
+                    return await self._execute(
+                        cmd, cwd, capture, timeout, stall_timeout, env or self.env
+                    )
+            finally:
+                if chain_lock is not None:
+                    chain_lock.release()
+        finally:
+            self._tasks.discard(task)
+
+    async def _execute(
+        self,
+        cmd: List[str],
+        cwd: Optional[Path],
+        capture: bool,
+        timeout: Optional[float],
+        stall_timeout: Optional[float],
+        env: Optional[Dict[str, str]],
+    ) -> CommandResult:
+        loop = asyncio.get_running_loop()
+        pipe = asyncio.subprocess.PIPE if capture else None
+        # A session of its own lets a kill reach helpers such as ssh or git-remote-https,
+        # which would otherwise keep the pipes open.
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            cwd=str(cwd) if cwd else None,
+            stdout=pipe,
+            stderr=pipe,
+            env=env,
+            start_new_session=True,
+        )
+        stdout, stderr = bytearray(), bytearray()
+        started = last_output = loop.time()
+
+        async def pump(stream: asyncio.StreamReader, buffer: bytearray) -> None:
+            nonlocal last_output
+            while True:
+                chunk = await stream.read(65536)
+                if not chunk:
+                    return
+                buffer += chunk
+                last_output = loop.time()
+
+        readers = []
+        if capture:
+            readers = [
+                asyncio.ensure_future(pump(process.stdout, stdout)),
+                asyncio.ensure_future(pump(process.stderr, stderr)),
+            ]
+        # process.wait() only returns once the pipes are closed too, which a background
+        # descendant holding stderr can put off indefinitely; the exit itself is seen by
+        # polling returncode.
+        exited = asyncio.ensure_future(process.wait())
+        try:
+            while not self._has_exited(process, exited):
+                deadlines = [loop.time() + EXIT_POLL_INTERVAL]
+                if timeout:
+                    deadlines.append(started + timeout)
+                if stall_timeout and capture:
+                    deadlines.append(last_output + stall_timeout)
+                await asyncio.wait([exited], timeout=max(0.0, min(deadlines) - loop.time()))
+                now = loop.time()
+                if self._has_exited(process, exited):
+                    break
+                if timeout and now >= started + timeout:
+                    error: subprocess.TimeoutExpired = subprocess.TimeoutExpired(
+                        cmd, timeout, bytes(stdout), bytes(stderr)
+                    )
+                elif stall_timeout and capture and now >= last_output + stall_timeout:
+                    error = CommandStalled(cmd, stall_timeout, bytes(stdout), bytes(stderr))
+                else:
+                    continue
+                await self._stop(process, exited)
+                raise error
+            # Output still buffered in the pipes is read for a short while; whatever a
+            # leftover descendant writes after that is not the command's.
+            if readers:
+                await asyncio.wait(readers, timeout=PIPE_DRAIN_TIMEOUT)
+            for task in (exited, *readers):
+                task.cancel()
+        except BaseException:
+            try:
+                await self._stop(process, exited)
+            finally:
+                self._signal(process, signal.SIGKILL)
+                for task in (exited, *readers):
+                    task.cancel()
+            raise
+        return CommandResult(
+            process.returncode,
+            stdout.decode(errors="replace"),
+            stderr.decode(errors="replace"),
+        )
+
+    async def _stop(self, process: asyncio.subprocess.Process, exited: asyncio.Future) -> None:
+        # SIGTERM first: git removes its lock files on it but not on SIGKILL, which only
+        # follows if the command is still running after the grace period.
+        self._signal(process, signal.SIGTERM)
+        if not await self._wait_exit(process, exited, KILL_GRACE_PERIOD):
+            self._signal(process, signal.SIGKILL)
+            await self._wait_exit(process, exited, KILL_GRACE_PERIOD)
+
+    async def _wait_exit(
+        self, process: asyncio.subprocess.Process, exited: asyncio.Future, timeout: float
+    ) -> bool:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not self._has_exited(process, exited):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            await asyncio.wait([exited], timeout=min(remaining, EXIT_POLL_INTERVAL))
+        return True
+
+    @staticmethod
+    def _has_exited(process: asyncio.subprocess.Process, exited: asyncio.Future) -> bool:
+        return exited.done() or process.returncode is not None
+
+    @staticmethod
+    def _signal(process: asyncio.subprocess.Process, signum: int) -> None:
+        if process.returncode is not None:
+            return
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(process.pid, signum)
+            else:
+                process.send_signal(signum)
+        except ProcessLookupError:
+            pass
+
+    def cancel_all(self) -> None:
+        # Used on Ctrl-C: running processes are stopped before this returns (or gives up
+        # shortly after the kill grace period) and no new command starts.
+        self._cancelled = True
+        if self._loop is not None:
+            wait(
+                [asyncio.run_coroutine_threadsafe(self._cancel_tasks(), self._loop)],
+                KILL_GRACE_PERIOD + 1,
+            )
+
+    async def _cancel_tasks(self) -> None:
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class ConcurrencyController:
+    # AIMD limit on concurrent operations, as in TCP congestion control: every operation
+    # that succeeds at steady latency grows the limit by 1/limit, about one slot per round
+    # of operations, a slower one shrinks it as much and an overload halves it. Operations
+    # started before the last cut cannot cut again, so one burst of errors from a single
+    # round halves it only once.
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.initial = int(self.limit)
+        self.lowest = self.highest = int(self.limit)
+        self.reductions = 0
+        self.in_flight = 0
+        self._last_reduction = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> float:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+            return time.monotonic()
+
+    def release(self, started: float, outcome: str, reason: str = "") -> None:
+        # "steady" grows the limit and "slow" shrinks it by the same step, "overload"
+        # halves it; any other outcome, such as an ordinary git error, leaves it.
+        with self._condition:
+            self.in_flight -= 1
+            if outcome == "overload":
+                if started >= self._last_reduction:
+                    self.limit = max(float(self.minimum), self.limit / 2)
+                    self._last_reduction = time.monotonic()
+                    self.reductions += 1
+                    logging.warning(
+                        f"GitLab is overloaded ({reason}), reducing concurrent git "
+                        f"operations to {int(self.limit)}"
+                    )
+            elif outcome == "steady":
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            elif outcome == "slow":
+                self.limit = max(float(self.minimum), self.limit - 1 / self.limit)
+            self.lowest = min(self.lowest, int(self.limit))
+            self.highest = max(self.highest, int(self.limit))
+            self._condition.notify_all()
+
+    def report(self) -> str:
+        return (
+            f"adaptive concurrency {int(self.limit)}: started at {self.initial}, "
+            f"range {self.lowest}-{self.highest} of at most {self.maximum}, "
+            f"{self.reductions} reductions"
+        )
+
+
 class GitLabRepoCleaner:
     def __init__(
         self,
@@ -23,8 +1296,36 @@ class GitLabRepoCleaner:
         include_directories: Optional[List[Path]] = None,
         force: bool = False,
         dry_run: bool = False,
+        api_workers: int = 8,
+        rate_limit: float = 10.0,
+        max_retries: int = 5,
+        use_cache: bool = True,
+        cache_directory: Path = DEFAULT_CACHE_DIRECTORY,
+        cache_ttl: float = 86400.0,
+        incremental: bool = False,
+        full_sync_interval: float = 24.0,
+        exclude_archived: bool = False,
+        api_backend: str = "rest",
+        async_api: bool = False,
+        max_in_flight: int = 8,
+        gitlab_url: str = "https://gitlab.com",
+        rescan: bool = False,
+        scan_workers: int = 1,
+        update_source: str = "local",
+        watch_interval: float = 30.0,
+        jobs: int = DEFAULT_UPDATE_JOBS,
+        update_strategy: str = "checkout",
+        skip_unchanged: bool = False,
+        fetch_timeout: float = 300.0,
+        clone_timeout: float = 3600.0,
+        stall_timeout: float = 60.0,
+        command_retries: int = 1,
+        schedule: str = "longest",
+        max_jobs: int = 0,
     ):
         self.group_id = group_id
+        self.gitlab_url = gitlab_url.rstrip("/")
+        self.group_api_url = f"{self.gitlab_url}/api/v4/groups/{quote(self.group_id, safe='')}"
         self.base_directory = base_directory.resolve()
         self.group_directory = (
             group_directory.resolve() if group_directory else self.base_directory / self.group_id
@@ -35,9 +1336,76 @@ class GitLabRepoCleaner:
         ]
         self.force = force
         self.dry_run = dry_run
+        self.api_workers = max(1, api_workers)
+        self.async_api = async_api
+        self.max_in_flight = max(1, max_in_flight)
         self.private_token = self.get_private_token()
         self.headers = {"PRIVATE-TOKEN": self.private_token}
         self.session = self._init_session()
+        self.scheduler = RequestScheduler(
+            self.session,
+            max_rate=rate_limit,
+            max_retries=max_retries,
+            max_in_flight=self.max_in_flight,
+        )
+        self.cache = (
+            ResponseCache(cache_directory / "responses", cache_ttl) if use_cache else None
+        )
+        self.incremental = incremental
+        self.full_sync_interval = timedelta(hours=full_sync_interval)
+        self.exclude_archived = exclude_archived
+        self.api_backend = api_backend
+        # Keyed by instance too: the same group path on two GitLab servers is two groups.
+        snapshot_key = f"{self.gitlab_url}\n{self.group_id}"
+        snapshot_name = hashlib.sha256(snapshot_key.encode()).hexdigest()[:16]
+        self.snapshot_path = cache_directory / "snapshots" / f"{snapshot_name}.json"
+        self.use_index = use_cache
+        self.rescan = rescan
+        self.scan_workers = max(1, scan_workers)
+        self.update_source = update_source
+        self.watch_interval = watch_interval
+        self.jobs = max(1, jobs)
+        # With --max_jobs, --update runs that many workers and a ConcurrencyController,
+        # starting from --jobs, decides how many of them may talk to GitLab at once.
+        self.max_jobs = max(self.jobs, max_jobs) if max_jobs > 0 else 0
+        self.workers = self.max_jobs or self.jobs
+        self.concurrency: Optional[ConcurrencyController] = None
+        self.update_strategy = update_strategy
+        # The workers also bound the git processes running at once. Commands must fail
+        # instead of waiting for a credential prompt that nobody answers.
+        # ssh gets BatchMode only when the user has no ssh command of their own, which
+        # GIT_SSH_COMMAND would take precedence over.
+        self.command_env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+        self.batch_ssh = not self._has_ssh_command(self.command_env)
+        engine_env = (
+            dict(self.command_env, GIT_SSH_COMMAND=BATCH_SSH_COMMAND)
+            if self.batch_ssh
+            else self.command_env
+        )
+        self.engine = CommandEngine(max_processes=self.workers, env=engine_env)
+        # A timeout of 0 disables it. Local checkouts and merges get none: killing one
+        # halfway leaves a partly written working tree that blocks the next checkout.
+        self.git_timeouts = {
+            "fetch": fetch_timeout or None,
+            "ls-remote": fetch_timeout or None,
+        }
+        self.clone_timeout = clone_timeout or None
+        self.stall_timeout = stall_timeout or None
+        self.command_retries = max(0, command_retries)
+        self.schedule = schedule
+        self.skip_unchanged = skip_unchanged
+        # Namespace directories seen by the last discovery, for identify_empty_namespaces.
+        self.local_namespaces: Set[str] = set()
+        # Default branch and last activity of each project by local path, from the GitLab
+        # listing.
+        self.default_branches: Dict[str, str] = {}
+        self.last_activity_at: Dict[str, str] = {}
+        # Duration of each repository's last complete update by local path, from the index.
+        self.previous_durations: Dict[str, float] = {}
+        # Moving average of network git latencies, spikes left out, by (local path,
+        # operation): the baseline for the ConcurrencyController's latency checks.
+        self.network_latencies: Dict[Tuple[str, str], float] = {}
+        self.index_directory = cache_directory / "index"
         self._check_dependencies()
 
     @staticmethod
@@ -59,6 +1427,12 @@ class GitLabRepoCleaner:
             default="",
             help="GitLab group ID or full path (default: kitopi-com)",
         )
+        parser.add_argument(
+            "--gitlab_url",
+            type=str,
+            default="https://gitlab.com",
+            help="Base URL of the GitLab instance (default: https://gitlab.com)",
+        )
         parser.add_argument(
             "--base_directory",
             type=Path,
@@ -91,6 +1465,176 @@ class GitLabRepoCleaner:
             action="store_true",
             help="Update all Git repositories in the base_directory",
         )
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Keep the local repository index up to date with inotify until interrupted",
+        )
+        parser.add_argument(
+            "--watch_interval",
+            type=float,
+            default=30.0,
+            help="Seconds between watcher heartbeats, and between mtime refreshes when "
+            "inotify cannot be used (default: 30)",
+        )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=DEFAULT_UPDATE_JOBS,
+            help="Repositories updated in parallel by --update "
+            f"(default: CPU count capped at 8, here {DEFAULT_UPDATE_JOBS})",
+        )
+        parser.add_argument(
+            "--max_jobs",
+            type=int,
+            default=0,
+            help="Let --update adapt the number of concurrent fetches to GitLab between 1 "
+            "and this ceiling, starting from --jobs or the previous run's level "
+            "(default: 0, a fixed --jobs)",
+        )
+        parser.add_argument(
+            "--update_strategy",
+            choices=["checkout", "fetch"],
+            default="checkout",
+            help="How --update moves the default branch: 'checkout' checks it out and pulls, "
+            "'fetch' fetches once and fast-forwards it without a checkout (default: checkout)",
+        )
+        parser.add_argument(
+            "--skip_unchanged",
+            action="store_true",
+            help="Check each remote default branch with git ls-remote first and skip "
+            "repositories already at that commit",
+        )
+        parser.add_argument(
+            "--fetch_timeout",
+            type=float,
+            default=300.0,
+            help="Seconds after which git fetch and ls-remote are killed; 0 disables "
+            "(default: 300)",
+        )
+        parser.add_argument(
+            "--clone_timeout",
+            type=float,
+            default=3600.0,
+            help="Seconds after which the glab group clone is killed; 0 disables "
+            "(default: 3600)",
+        )
+        parser.add_argument(
+            "--stall_timeout",
+            type=float,
+            default=60.0,
+            help="Kill a git fetch whose progress output stalls this many seconds; "
+            "0 disables (default: 60)",
+        )
+        parser.add_argument(
+            "--command_retries",
+            type=int,
+            default=1,
+            help="Times a timed out clone or repository update is queued again (default: 1)",
+        )
+        parser.add_argument(
+            "--schedule",
+            choices=["discovery", "activity", "longest"],
+            default="longest",
+            help="Order in which --update hands repositories to the workers: as discovered, "
+            "most recent GitLab activity first, or longest previous update first "
+            "(default: longest)",
+        )
+        parser.add_argument(
+            "--update_source",
+            choices=["local", "api"],
+            default="local",
+            help="Where --update finds repositories: 'local' discovers them under "
+            "group_directory, 'api' checks base_directory/<path_with_namespace> for every "
+            "GitLab project and needs --group_id (default: local)",
+        )
+        parser.add_argument(
+            "--api_workers",
+            type=int,
+            default=8,
+            help="Number of GitLab API pages fetched concurrently (default: 8)",
+        )
+        parser.add_argument(
+            "--rate_limit",
+            type=float,
+            default=10.0,
+            help="Maximum GitLab API requests per second (default: 10)",
+        )
+        parser.add_argument(
+            "--max_retries",
+            type=int,
+            default=5,
+            help="Retries for rate-limited (429) or failed (5xx) API requests (default: 5)",
+        )
+        parser.add_argument(
+            "--no_cache",
+            "--no-cache",
+            action="store_true",
+            help="Do not use or update the on-disk caches (API responses, project snapshot "
+            "and local repository index)",
+        )
+        parser.add_argument(
+            "--cache_dir",
+            type=Path,
+            default=DEFAULT_CACHE_DIRECTORY,
+            help=f"GitLab API response cache directory (default: {DEFAULT_CACHE_DIRECTORY})",
+        )
+        parser.add_argument(
+            "--cache_ttl",
+            type=float,
+            default=86400.0,
+            help="Seconds after which cached API responses are fetched in full (default: 86400)",
+        )
+        parser.add_argument(
+            "--rescan",
+            action="store_true",
+            help="Rebuild the local repository index from a full scan of group_directory",
+        )
+        parser.add_argument(
+            "--scan_workers",
+            type=int,
+            default=1,
+            help="Threads probing directories while discovering local repositories; raise "
+            "it for network-mounted workspaces such as NFS (default: 1)",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Fetch only projects active since the previous sync and merge them into "
+            "the locally stored project list",
+        )
+        parser.add_argument(
+            "--full_sync_interval",
+            type=float,
+            default=24.0,
+            help="Hours between full project listings in incremental mode, so projects "
+            "deleted on GitLab are still detected (default: 24)",
+        )
+        parser.add_argument(
+            "--exclude_archived",
+            action="store_true",
+            help="Leave archived projects out of the GitLab listing; their local copies are "
+            "then treated as removed from GitLab",
+        )
+        parser.add_argument(
+            "--api_backend",
+            choices=["rest", "graphql"],
+            default="rest",
+            help="API used to list projects and members; graphql requests only the fields "
+            "the sync needs and falls back to rest on errors (default: rest)",
+        )
+        parser.add_argument(
+            "--async_api",
+            action="store_true",
+            help="Run the group clone, project listing and member listing concurrently "
+            "on one event loop",
+        )
+        parser.add_argument(
+            "--max_in_flight",
+            type=int,
+            default=8,
+            help="Maximum concurrent GitLab API requests across all listings (default: 8)",
+        )
         return parser.parse_args()
 
     @staticmethod
@@ -104,133 +1648,853 @@ class GitLabRepoCleaner:
     def _init_session(self) -> Session:
         session = requests.Session()
         session.headers.update(self.headers)
+        pool_size = max(self.api_workers, self.max_in_flight)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
         return session
 
+    @staticmethod
+    def _has_ssh_command(env: Dict[str, str]) -> bool:
+        if env.get("GIT_SSH_COMMAND") or env.get("GIT_SSH"):
+            return True
+        # System and global configuration; a repository's own is checked per command.
+        result = subprocess.run(
+            ["git", "config", "--get", "core.sshCommand"],
+            cwd=os.path.abspath(os.sep),
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        return bool(result.stdout.strip())
+
     def _check_dependencies(self) -> None:
         if not shutil.which("glab"):
             logging.error("The 'glab' tool is not installed or not in PATH.")
             raise EnvironmentError("The 'glab' tool is not installed or not in PATH.")
 
-    def run_command(self, cmd: List[str], cwd: Optional[Path] = None) -> None:
+    def run_command(
+        self, cmd: List[str], cwd: Optional[Path] = None, timeout: Optional[float] = None
+    ) -> None:
         cwd = cwd.resolve() if cwd else None
         try:
-            subprocess.run(cmd, check=True, cwd=str(cwd) if cwd else None)
+            # Not captured: glab reports clone progress on the terminal.
+            result = self.engine.run(cmd, cwd=cwd, capture=False, timeout=timeout)
+            if result.returncode != 0:
+                raise subprocess.CalledProcessError(result.returncode, cmd)
             logging.info(f"Executed command: {' '.join(cmd)}")
-        except subprocess.CalledProcessError as e:
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
             logging.error(f"Error while executing command {' '.join(cmd)}: {e}")
             raise
 
     def update_git_repositories(self) -> None:
         logging.info("Updating all Git repositories in the base_directory...")
-        for root, dirs, _ in os.walk(self.group_directory):
-            for directory in dirs:
-                repo_path = Path(root) / directory
-                if self.is_git_repo(repo_path):
-                    self.update_git_repo(repo_path)
+        if self.update_source == "api":
+            repo_paths: Iterable[Path] = self.get_update_targets_from_api()
+        else:
+            self._load_project_metadata()
+            repo_paths = self.iter_local_repo_paths()
+        self.previous_durations = self._load_update_durations()
+        if self.max_jobs:
+            self.concurrency = ConcurrencyController(
+                initial=self._load_concurrency() or self.jobs, maximum=self.max_jobs
+            )
+            self.network_latencies = self._load_network_latencies()
+        scheduled = self.schedule_repos(list(repo_paths))
+        started = time.monotonic()
+        results = self._update_repos(scheduled)
+        # Repositories whose git commands were killed by a timeout are queued again once
+        # the first pass is done, so a slow remote does not hold up everything else.
+        for _ in range(self.command_retries):
+            retry_queue = [result.path for result in results if result.status == "timed out"]
+            if not retry_queue:
+                break
+            logging.info(f"Retrying {len(retry_queue)} repositories that timed out...")
+            retried = {result.path: result for result in self._update_repos(retry_queue)}
+            results = [retried.get(result.path, result) for result in results]
+        self._store_update_durations(results)
+        if self.concurrency is not None:
+            self._store_concurrency(int(self.concurrency.limit))
+            self._store_network_latencies()
+        self._log_update_summary(results, time.monotonic() - started)
+
+    def schedule_repos(self, repo_paths: List[Path]) -> List[Path]:
+        # Workers take repositories in this order. "activity" starts with the most recently
+        # active projects, the likeliest to have changed; "longest" starts the slowest ones
+        # first so a long fetch does not end up alone at the tail of the run.
+        if self.schedule == "activity":
+            oldest = datetime.min.replace(tzinfo=timezone.utc)
+            activity = {
+                path: self._parse_timestamp(value)
+                for path, value in self.last_activity_at.items()
+            }
+            return sorted(
+                repo_paths, key=lambda path: activity.get(str(path), oldest), reverse=True
+            )
+        if self.schedule == "longest":
+            durations = self.previous_durations
+            # Repositories without a recorded update (typically new clones) go first,
+            # largest pack files first, then the others by their last update duration.
+            return sorted(
+                repo_paths,
+                key=lambda path: (
+                    (1, -durations[str(path)])
+                    if str(path) in durations
+                    else (0, -self._pack_size(path))
+                ),
+            )
+        return repo_paths
+
+    @staticmethod
+    def _pack_size(repo_path: Path) -> int:
+        try:
+            with os.scandir(repo_path / ".git" / "objects" / "pack") as entries:
+                return sum(
+                    entry.stat().st_size for entry in entries if entry.name.endswith(".pack")
+                )
+        except OSError:
+            return 0
+
+    def _load_update_durations(self) -> Dict[str, float]:
+        if not self.use_index or not self.group_directory.is_dir():
+            return {}
+        index = self._open_repo_index(self.group_directory)
+        try:
+            return index.update_durations()
+        finally:
+            index.close()
+
+    def _store_update_durations(self, results: List[RepoUpdateResult]) -> None:
+        # Only complete updates are a fair estimate of the next one.
+        durations = {
+            str(result.path): result.duration
+            for result in results
+            if result.status in ("updated", "unchanged")
+        }
+        if durations and self.use_index and self.group_directory.is_dir():
+            index = self._open_repo_index(self.group_directory)
+            try:
+                index.store_update_durations(durations)
+            finally:
+                index.close()
+
+    def _load_concurrency(self) -> Optional[int]:
+        # The level the controller ended the previous run at, so it does not converge
+        # again from --jobs every time.
+        if not self.use_index or not self.group_directory.is_dir():
+            return None
+        index = self._open_repo_index(self.group_directory)
+        try:
+            return index.get_concurrency()
+        finally:
+            index.close()
+
+    def _store_concurrency(self, level: int) -> None:
+        if self.use_index and self.group_directory.is_dir():
+            index = self._open_repo_index(self.group_directory)
+            try:
+                index.set_concurrency(level)
+            finally:
+                index.close()
+
+    def _load_network_latencies(self) -> Dict[Tuple[str, str], float]:
+        if not self.use_index or not self.group_directory.is_dir():
+            return {}
+        index = self._open_repo_index(self.group_directory)
+        try:
+            return index.network_latencies()
+        finally:
+            index.close()
+
+    def _store_network_latencies(self) -> None:
+        if self.network_latencies and self.use_index and self.group_directory.is_dir():
+            index = self._open_repo_index(self.group_directory)
+            try:
+                index.store_network_latencies(self.network_latencies)
+            finally:
+                index.close()
+
+    def _update_repos(self, repo_paths: Iterable[Path]) -> List[RepoUpdateResult]:
+        if self.workers == 1:
+            return [self.update_git_repo(repo_path) for repo_path in repo_paths]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                return list(executor.map(self.update_git_repo, repo_paths))
+            except KeyboardInterrupt:
+                self.engine.cancel_all()
+                executor.shutdown(cancel_futures=True)
+                raise
+
+    def get_update_targets_from_api(self) -> List[Path]:
+        gitlab_repositories = self.fetch_gitlab_repositories()
+        targets, missing = [], []
+        for path in gitlab_repositories:
+            repo_path = self.base_directory / path
+            (targets if self.is_git_repo(repo_path) else missing).append(repo_path)
+        for repo_path in missing:
+            logging.info(f"Repository not cloned locally: {repo_path}")
+        expected = set(targets)
+        max_depth = self.get_discovery_depth(gitlab_repositories)
+        untracked = [
+            repo_path
+            for repo_path in self.iter_local_repo_paths(max_depth)
+            if repo_path not in expected
+        ]
+        for repo_path in untracked:
+            logging.info(f"Local repository not found on GitLab: {repo_path}")
+        logging.info(
+            f"Updating {len(targets)} repositories from the GitLab project list "
+            f"({len(missing)} not cloned, {len(untracked)} local-only skipped)."
+        )
+        return targets
 
     @staticmethod
     def is_git_repo(path: Path) -> bool:
         return (path / ".git").is_dir()
 
-    def get_default_branch(self, repo_path: Path) -> str:
+    def _run_git(
+        self, repo_path: Path, args: List[str], output: List[str], check: bool = True
+    ) -> str:
+        # Output is captured per repository so parallel updates do not interleave on the
+        # terminal; it is logged with the error when an update fails. Network operations
+        # print --progress so the stall watchdog can tell a slow transfer from a hung one.
+        operation = args[0]
+        stall_timeout = self.stall_timeout if operation == "fetch" else None
+        if stall_timeout:
+            args = [operation, "--progress", *args[1:]]
+        env = None
+        if self.batch_ssh and operation in NETWORK_GIT_OPERATIONS:
+            reader = GitRefReader.open(repo_path)
+            if reader is not None and reader.config_value("core", "sshCommand"):
+                env = self.command_env
+        controller = self.concurrency if operation in NETWORK_GIT_OPERATIONS else None
+        started = controller.acquire() if controller is not None else 0.0
+        outcome, reason = "error", ""
         try:
-            default_branch = (
-                subprocess.check_output(
-                    ["git", "rev-parse", "--abbrev-ref", "origin/HEAD"],
-                    cwd=repo_path,
-                    text=True,
-                )
-                .strip()
-                .replace("origin/", "")
+            result = self.engine.run(
+                ["git", *args],
+                cwd=repo_path,
+                chain=str(repo_path),
+                timeout=self.git_timeouts.get(operation),
+                stall_timeout=stall_timeout,
+                env=env,
+            )
+            if controller is not None:
+                outcome, reason = self._network_outcome(repo_path, operation, result, started)
+        except subprocess.TimeoutExpired as e:
+            outcome = "overload"
+            reason = "stalled" if isinstance(e, CommandStalled) else "timed out"
+            partial = (e.output or b"") + (e.stderr or b"")
+            output.append(f"$ git {' '.join(args)}\n{partial.decode(errors='replace')}")
+            raise
+        finally:
+            if controller is not None:
+                controller.release(started, outcome, reason)
+        output.append(f"$ git {' '.join(args)}\n{result.stdout}{result.stderr}")
+        if check and result.returncode != 0:
+            raise subprocess.CalledProcessError(
+                result.returncode, ["git", *args], result.stdout, result.stderr
+            )
+        return result.stdout.strip()
+
+    def _network_outcome(
+        self, repo_path: Path, operation: str, result: CommandResult, started: float
+    ) -> Tuple[str, str]:
+        # How a network git operation feeds the ConcurrencyController. Latency is compared
+        # with the same operation on the same repository in earlier runs, since fetch times
+        # differ by orders of magnitude between repositories and an ls-remote is far
+        # quicker than a fetch; the first time only errors count.
+        if result.returncode != 0:
+            stderr = result.stderr.lower()
+            marker = next((marker for marker in OVERLOAD_MARKERS if marker in stderr), None)
+            return ("overload", marker) if marker else ("error", "")
+        latency = time.monotonic() - started
+        key = (str(repo_path), operation)
+        baseline = self.network_latencies.get(key)
+        if baseline is None:
+            self.network_latencies[key] = latency
+            return "steady", ""
+        if latency > baseline * LATENCY_SPIKE_RATIO + LATENCY_SLACK:
+            # Spikes stay out of the baseline so it keeps describing an unloaded server.
+            return (
+                "overload",
+                f"{operation} took {latency:.1f}s instead of about {baseline:.1f}s",
             )
+        self.network_latencies[key] = baseline + LATENCY_EWMA_WEIGHT * (latency - baseline)
+        if latency > baseline * LATENCY_STEADY_RATIO + LATENCY_SLACK:
+            return "slow", ""
+        return "steady", ""
+
+    def get_default_branch(self, repo_path: Path, output: Optional[List[str]] = None) -> str:
+        reader = GitRefReader.open(repo_path)
+        try:
+            if reader is not None:
+                target = reader.symbolic_target("refs/remotes/origin/HEAD")
+                if target is None:
+                    raise RuntimeError("refs/remotes/origin/HEAD is not set")
+                default_branch = target.removeprefix("refs/remotes/origin/")
+            else:
+                default_branch = self._run_git(
+                    repo_path,
+                    ["rev-parse", "--abbrev-ref", "origin/HEAD"],
+                    [] if output is None else output,
+                ).replace("origin/", "")
             logging.info(f"Default branch for {repo_path}: {default_branch}")
             return default_branch
-        except subprocess.CalledProcessError as e:
+        except (subprocess.CalledProcessError, RuntimeError) as e:
             logging.error(f"Failed to determine default branch for {repo_path}: {e}")
             raise RuntimeError(f"Cannot determine default branch for {repo_path}")
 
-    def update_git_repo(self, repo_path: Path) -> None:
+    def update_git_repo(self, repo_path: Path) -> RepoUpdateResult:
         logging.info(f"Processing repository: {repo_path}")
+        started = time.monotonic()
+        output: List[str] = []
         try:
-            current_branch = subprocess.check_output(
-                ["git", "branch", "--show-current"], cwd=repo_path, text=True
-            ).strip()
+            current_branch = self._current_branch(repo_path, output)
 
             if not current_branch:
                 logging.warning(f"Repository {repo_path} is in a detached HEAD state.")
 
-            default_branch = self.get_default_branch(repo_path=repo_path)
+            # origin/HEAD is stale after a default branch rename, so the GitLab value wins;
+            # rev-parse is only asked for repositories missing from the listing.
+            default_branch = self.default_branches.get(str(repo_path))
+            if not default_branch:
+                default_branch = self.get_default_branch(repo_path, output)
+            old_head = self._ref_head(repo_path, f"refs/heads/{default_branch}", output)
+            if self.skip_unchanged and self._matches_remote(
+                repo_path, default_branch, old_head, output
+            ):
+                logging.info(f"Skipped {repo_path}: {default_branch} matches origin")
+                return RepoUpdateResult(
+                    repo_path, "skipped", time.monotonic() - started, "".join(output), None
+                )
 
-            subprocess.run(["git", "checkout", default_branch], cwd=repo_path, check=True)
-            logging.info(f"Checked out default branch: {default_branch}")
+            if self.update_strategy == "fetch":
+                self._fast_forward_default_branch(
+                    repo_path, current_branch, default_branch, old_head, output
+                )
+            else:
+                self._checkout_and_pull(repo_path, current_branch, default_branch, output)
+            new_head = self._ref_head(repo_path, f"refs/heads/{default_branch}", output)
+
+        except subprocess.TimeoutExpired as e:
+            logging.error(f"Killed update of {repo_path}: {e}\n{''.join(output)}")
+            return RepoUpdateResult(
+                repo_path, "timed out", time.monotonic() - started, "".join(output), f"{e}"
+            )
+        except subprocess.CalledProcessError as e:
+            error = f"{e}"
+            logging.error(f"Failed to update repository {repo_path}: {e}\n{''.join(output)}")
+        except RuntimeError as e:
+            error = f"{e}"
+            logging.error(f"Error during update of {repo_path}: {e}")
+        else:
+            status = "updated" if new_head != old_head else "unchanged"
+            return RepoUpdateResult(
+                repo_path, status, time.monotonic() - started, "".join(output), None
+            )
+        return RepoUpdateResult(
+            repo_path, "failed", time.monotonic() - started, "".join(output), error
+        )
 
-            subprocess.run(["git", "pull"], cwd=repo_path, check=True)
-            logging.info(f"Pulled latest changes for {repo_path}")
+    def _checkout_and_pull(
+        self, repo_path: Path, current_branch: str, default_branch: str, output: List[str]
+    ) -> None:
+        # A pull split in two: only the fetch has a time limit, since stopping the merge
+        # halfway would leave a partly written working tree. Fetching first also brings in
+        # a default branch renamed on GitLab, so checkout can create it from origin.
+        self._run_git(repo_path, ["fetch", "origin"], output)
+        self._run_git(repo_path, ["checkout", default_branch], output)
+        logging.info(f"Checked out default branch: {default_branch}")
 
+        try:
+            self._run_git(repo_path, ["merge", "--ff-only", "@{u}"], output)
+        except Exception:
+            # A failed merge must not leave the user on the default branch.
             if current_branch:
-                subprocess.run(["git", "checkout", current_branch], cwd=repo_path, check=True)
-                logging.info(f"Switched back to branch: {current_branch}")
+                self._run_git(repo_path, ["checkout", current_branch], output, False)
+            raise
+        logging.info(f"Pulled latest changes for {repo_path}")
+
+        if current_branch:
+            self._run_git(repo_path, ["checkout", current_branch], output)
+            logging.info(f"Switched back to branch: {current_branch}")
+
+    def _current_branch(self, repo_path: Path, output: List[str]) -> str:
+        # Empty for a detached HEAD.
+        reader = GitRefReader.open(repo_path)
+        if reader is not None:
+            return reader.current_branch()
+        return self._run_git(repo_path, ["branch", "--show-current"], output)
+
+    def _ref_head(self, repo_path: Path, ref: str, output: List[str]) -> str:
+        # Empty when the ref does not exist.
+        reader = GitRefReader.open(repo_path)
+        if reader is not None:
+            return reader.resolve(ref) or ""
+        return self._run_git(repo_path, ["rev-parse", "--verify", "--quiet", ref], output, False)
 
+    def _matches_remote(
+        self, repo_path: Path, default_branch: str, old_head: str, output: List[str]
+    ) -> bool:
+        # ls-remote only reads the advertised refs, much cheaper than a fetch negotiation.
+        # Both the remote-tracking ref and the local branch must already be at that head.
+        listing = self._run_git(
+            repo_path, ["ls-remote", "origin", f"refs/heads/{default_branch}"], output
+        )
+        remote_head = listing.split("\t", 1)[0]
+        tracking_head = self._ref_head(
+            repo_path, f"refs/remotes/origin/{default_branch}", output
+        )
+        return bool(remote_head) and remote_head == tracking_head == old_head
+
+    def _fast_forward_default_branch(
+        self,
+        repo_path: Path,
+        current_branch: str,
+        default_branch: str,
+        old_head: str,
+        output: List[str],
+    ) -> None:
+        # One fetch, then the default branch is moved without checking anything out; the
+        # working tree is only touched when the user is on the default branch.
+        remote_ref = f"refs/remotes/origin/{default_branch}"
+        self._run_git(repo_path, ["fetch", "origin"], output)
+        logging.info(f"Fetched origin for {repo_path}")
+        if current_branch == default_branch:
+            self._run_git(repo_path, ["merge", "--ff-only", remote_ref], output)
+            logging.info(f"Fast-forwarded checked out branch: {default_branch}")
+            return
+        remote_head = self._ref_head(repo_path, remote_ref, output)
+        if not remote_head:
+            raise RuntimeError(f"{remote_ref} does not exist after fetching origin")
+        if not old_head:
+            self._run_git(repo_path, ["branch", "--track", default_branch, remote_ref], output)
+            logging.info(f"Created local branch {default_branch} at {remote_ref}")
+            return
+        try:
+            self._run_git(
+                repo_path, ["merge-base", "--is-ancestor", old_head, remote_head], output
+            )
         except subprocess.CalledProcessError as e:
-            logging.error(f"Failed to update repository {repo_path}: {e}")
-        except RuntimeError as e:
-            logging.error(f"Error during update of {repo_path}: {e}")
+            if e.returncode != 1:
+                raise
+            raise RuntimeError(f"{default_branch} has diverged from origin/{default_branch}")
+        if remote_head != old_head:
+            # The old value makes update-ref refuse if the branch moved since it was read.
+            self._run_git(
+                repo_path,
+                ["update-ref", f"refs/heads/{default_branch}", remote_head, old_head],
+                output,
+            )
+            logging.info(f"Fast-forwarded {default_branch} without a checkout")
+
+    def _log_update_summary(self, results: List[RepoUpdateResult], elapsed: float) -> None:
+        counts: Dict[str, int] = {}
+        for status in ("updated", "unchanged", "timed out", "failed"):
+            group = sorted(
+                (result for result in results if result.status == status),
+                key=lambda result: result.path,
+            )
+            counts[status] = len(group)
+            if group:
+                logging.info(f"\n{status.capitalize()} repositories ({len(group)}):")
+            for result in group:
+                error = f": {result.error}" if result.error else ""
+                logging.info(f"  {result.path} ({result.duration:.1f}s){error}")
+        skipped = [result.duration for result in results if result.status == "skipped"]
+        if skipped:
+            full = [
+                result.duration
+                for result in results
+                if result.status in ("updated", "unchanged")
+            ]
+            if full:
+                saved = len(skipped) * sum(full) / len(full) - sum(skipped)
+                estimate = f", saving about {max(saved, 0.0):.1f}s of repository update time"
+            else:
+                estimate = ""
+            logging.info(f"\nSkipped {len(skipped)} repositories already at origin{estimate}.")
+        if self.concurrency is not None:
+            jobs = f"{self.workers} workers, {self.concurrency.report()}"
+        else:
+            jobs = f"{self.jobs} jobs"
+        logging.info(
+            f"Updated {counts['updated']}, unchanged {counts['unchanged']}, skipped "
+            f"{len(skipped)}, timed out {counts['timed out']}, failed {counts['failed']} "
+            f"of {len(results)} repositories in {elapsed:.1f}s ({jobs})."
+        )
+
+    def _get_page(
+        self,
+        url: str,
+        params: Optional[Dict],
+        use_cache: bool = True,
+        parse: Optional[Callable[[Dict], Any]] = None,
+    ) -> Tuple[List[Any], Response]:
+        use_cache = use_cache and self.cache is not None
+        cached = self.cache.load(url, params) if use_cache else None
+        headers = ResponseCache.conditional_headers(cached) if cached else None
+        response = self.scheduler.get(url, params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            # GitLab recomputes pagination headers for a 304; the cached ones are only a
+            # fallback for proxies that strip them all.
+            if not any(name in response.headers for name in CACHED_RESPONSE_HEADERS):
+                response.headers.update(cached["headers"])
+            self.cache.refresh(url, params, cached)
+            data = cached["body"]
+            return [parse(item) for item in data] if parse else data, response
+        if response.status_code != 200:
+            logging.error(f"Error {response.status_code} while accessing {url}")
+            raise GitLabAPIError(f"Error {response.status_code} while accessing {url}")
+        try:
+            data = response.json()
+        except ValueError:
+            logging.error(f"Cannot decode JSON response from {url}")
+            raise GitLabAPIError(f"Cannot decode JSON response from {url}")
+        if not isinstance(data, list):
+            logging.error(f"Expected a list, received: {type(data)}")
+            raise GitLabAPIError(f"Expected a list, received: {type(data)}")
+        if use_cache:
+            self.cache.store(url, params, response, data)
+        return [parse(item) for item in data] if parse else data, response
+
+    @staticmethod
+    def _get_int_header(response: Response, name: str) -> Optional[int]:
+        value = response.headers.get(name, "").strip()
+        return int(value) if value.isdigit() else None
 
     def get_json_response(
-        self, url: str, params: Optional[Dict[str, str]] | Optional[Dict[str, bool]] = None
-    ) -> List[Dict]:
-        results = []
+        self,
+        url: str,
+        params: Optional[Dict[str, str]] | Optional[Dict[str, bool]] = None,
+        keyset: bool = False,
+        parse: Optional[Callable[[Dict], Any]] = None,
+    ) -> List[Any]:
+        return list(self.iter_json_response(url, params, keyset=keyset, parse=parse))
+
+    def iter_json_response(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        keyset: bool = False,
+        parse: Optional[Callable[[Dict], Any]] = None,
+        use_cache: bool = True,
+    ) -> Iterator[Any]:
+        base_params = params.copy() if params else {}
+        base_params["per_page"] = PER_PAGE
+        first_page, response = self._get_page(
+            url, {**base_params, "page": 1}, use_cache=use_cache, parse=parse
+        )
+        total = self._get_int_header(response, "X-Total")
+        total_pages = self._get_int_header(response, "X-Total-Pages")
+        # Deep offset pages get slower the further they go; large (or unreported) result
+        # sets are re-read with keyset pagination, which costs the same for every page.
+        large = len(first_page) == PER_PAGE and (total is None or total > KEYSET_THRESHOLD)
+        if keyset and large:
+            logging.info(f"Large result set at {url}, switching to keyset pagination")
+            yield from self._iter_pages_by_keyset(url, base_params, use_cache, parse)
+            return
+        yield from first_page
+        if total_pages is None:
+            # GitLab omits X-Total/X-Total-Pages for result sets above 10,000 rows.
+            if len(first_page) == PER_PAGE:
+                yield from self._iter_remaining_pages_sequentially(
+                    url, base_params, response, use_cache, parse
+                )
+        elif total_pages > 1:
+            logging.info(f"Fetching {total} items from {url} across {total_pages} pages")
+            yield from self._iter_remaining_pages_in_parallel(
+                url, base_params, total_pages, use_cache, parse
+            )
+
+    def _iter_pages_by_keyset(
+        self,
+        url: str,
+        base_params: Dict,
+        use_cache: bool,
+        parse: Optional[Callable[[Dict], Any]],
+    ) -> Iterator[Any]:
+        params = {**base_params, "pagination": "keyset", "order_by": "id", "sort": "asc"}
+        next_url: Optional[str] = url
+        while next_url:
+            data, response = self._get_page(next_url, params, use_cache=use_cache, parse=parse)
+            yield from data
+            # The "next" link already carries the cursor and all query parameters.
+            next_url = response.links.get("next", {}).get("url")
+            params = None
+
+    def _iter_remaining_pages_in_parallel(
+        self,
+        url: str,
+        base_params: Dict,
+        total_pages: int,
+        use_cache: bool,
+        parse: Optional[Callable[[Dict], Any]],
+    ) -> Iterator[Any]:
+        pages = iter(range(2, total_pages + 1))
+        executor = ThreadPoolExecutor(max_workers=self.api_workers)
+
+        def submit(page: int) -> Future:
+            page_params = {**base_params, "page": page}
+            return executor.submit(
+                self._get_page, url, page_params, use_cache=use_cache, parse=parse
+            )
+
+        try:
+            # Keep a bounded window of pages in flight so a slow consumer does not make
+            # the whole listing pile up in memory.
+            pending: Deque[Future] = deque(
+                submit(page) for page in itertools.islice(pages, self.api_workers * 2)
+            )
+            while pending:
+                data, _ = pending.popleft().result()
+                page = next(pages, None)
+                if page is not None:
+                    pending.append(submit(page))
+                yield from data
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _iter_remaining_pages_sequentially(
+        self,
+        url: str,
+        base_params: Dict,
+        response: Response,
+        use_cache: bool,
+        parse: Optional[Callable[[Dict], Any]],
+    ) -> Iterator[Any]:
         page = 1
         while True:
-            current_params = params.copy() if params else {}
-            current_params.update({"page": page, "per_page": 100})
-            response = self.session.get(url, params=current_params)
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    if not isinstance(data, list):
-                        logging.error(f"Expected a list, received: {type(data)}")
-                        raise GitLabAPIError(f"Expected a list, received: {type(data)}")
-                except ValueError:
-                    logging.error(f"Cannot decode JSON response from {url}")
-                    raise GitLabAPIError(f"Cannot decode JSON response from {url}")
-
-                if not data:
-                    break
-                results.extend(data)
-                page += 1
+            next_page = response.headers.get("X-Next-Page")
+            if next_page is not None:
+                if not next_page.strip():
+                    return
+                page = int(next_page)
             else:
+                page += 1
+            data, response = self._get_page(
+                url, {**base_params, "page": page}, use_cache=use_cache, parse=parse
+            )
+            yield from data
+            if len(data) < PER_PAGE:
+                return
+
+    def iter_graphql_nodes(self, query: str, connection: str) -> Iterator[Dict]:
+        if self.group_id.isdigit():
+            raise GitLabAPIError("GraphQL needs the group full path, not its numeric ID")
+        url = f"{self.gitlab_url}/api/graphql"
+        headers = {"Authorization": f"Bearer {self.private_token}"}
+        variables: Dict[str, Any] = {"fullPath": self.group_id, "after": None}
+        while True:
+            response = self.scheduler.request(
+                "POST", url, json={"query": query, "variables": variables}, headers=headers
+            )
+            if response.status_code != 200:
                 logging.error(f"Error {response.status_code} while accessing {url}")
                 raise GitLabAPIError(f"Error {response.status_code} while accessing {url}")
-        return results
+            try:
+                payload = response.json()
+            except ValueError:
+                logging.error(f"Cannot decode JSON response from {url}")
+                raise GitLabAPIError(f"Cannot decode JSON response from {url}")
+            if payload.get("errors"):
+                messages = "; ".join(error.get("message", "") for error in payload["errors"])
+                raise GitLabAPIError(f"GraphQL errors from {url}: {messages}")
+            group = (payload.get("data") or {}).get("group")
+            if group is None:
+                raise GitLabAPIError(f"Group {self.group_id} not found via GraphQL")
+            nodes = group[connection]
+            yield from nodes["nodes"]
+            if not nodes["pageInfo"]["hasNextPage"]:
+                return
+            variables["after"] = nodes["pageInfo"]["endCursor"]
 
-    def get_group_repositories(self) -> Dict[str, str]:
-        url = f"https://gitlab.com/api/v4/groups/{self.group_id}/projects"
+    def get_group_repositories(self) -> Dict[str, ProjectRecord]:
+        url = f"{self.group_api_url}/projects"
         try:
-            projects = self.get_json_response(url, params={"include_subgroups": True})
-            return {
-                project["path_with_namespace"]: project["http_url_to_repo"]
-                for project in projects
-            }
+            if self.incremental:
+                projects = self._get_group_projects_incrementally(url)
+            else:
+                projects = self._get_all_group_projects(url)
+            return {project.path_with_namespace: project for project in projects}
         except GitLabAPIError as e:
+            # An empty project list would mark every local repository for deletion.
             logging.error(f"Failed to fetch group repositories: {e}")
-            return {}
+            raise
+
+    def _project_list_params(self) -> Dict[str, Any]:
+        params: Dict[str, Any] = {
+            "include_subgroups": True,
+            "simple": True,
+            "with_shared": False,
+        }
+        if self.exclude_archived:
+            params["archived"] = False
+        return params
+
+    def _get_all_group_projects(self, url: str) -> List[ProjectRecord]:
+        if self.api_backend == "graphql":
+            try:
+                projects = [
+                    ProjectRecord.from_graphql(node)
+                    for node in self.iter_graphql_nodes(GRAPHQL_PROJECTS_QUERY, "projects")
+                ]
+                if self.exclude_archived:
+                    projects = [project for project in projects if not project.archived]
+                return projects
+            except GitLabAPIError as e:
+                logging.warning(f"GraphQL project listing failed, falling back to REST: {e}")
+        return self.get_json_response(
+            url,
+            params={**self._project_list_params(), "order_by": "id", "sort": "asc"},
+            keyset=True,
+            parse=ProjectRecord.from_json,
+        )
+
+    def _get_group_projects_incrementally(self, url: str) -> List[ProjectRecord]:
+        started_at = datetime.now(timezone.utc)
+        # With --no_cache the snapshot is neither read nor written.
+        snapshot = self._load_project_snapshot() if self.cache is not None else None
+        filters = {"exclude_archived": self.exclude_archived, "api_backend": self.api_backend}
+        # Deltas merged into a snapshot listed with other filters would, for instance, leave
+        # out every archived project and get their local clones deleted.
+        if snapshot is None or snapshot.get("filters") != filters:
+            reconcile = True
+        else:
+            last_full_sync = self._parse_timestamp(snapshot["full_sync_at"])
+            reconcile = started_at - last_full_sync > self.full_sync_interval
+        if reconcile:
+            logging.info("Running a full project listing to reconcile the local snapshot.")
+            projects = {project.id: project for project in self._get_all_group_projects(url)}
+            full_sync_at = started_at
+        else:
+            projects = snapshot["projects"]
+            changes = self._get_project_changes(url, snapshot["cursor"])
+            logging.info(f"Merged {len(changes)} projects active since {snapshot['cursor']}.")
+            for project in changes:
+                projects[project.id] = project
+            full_sync_at = self._parse_timestamp(snapshot["full_sync_at"])
+        if self.cache is None:
+            return list(projects.values())
+        self._save_project_snapshot(
+            {
+                "cursor": self._format_timestamp(started_at - ACTIVITY_CURSOR_OVERLAP),
+                "full_sync_at": self._format_timestamp(full_sync_at),
+                "filters": filters,
+                "projects": list(projects.values()),
+            }
+        )
+        return list(projects.values())
+
+    def _get_project_changes(self, url: str, cursor: str) -> List[ProjectRecord]:
+        cursor_time = self._parse_timestamp(cursor)
+        params = {
+            **self._project_list_params(),
+            "last_activity_after": cursor,
+            "order_by": "last_activity_at",
+            "sort": "desc",
+        }
+        changes = []
+        projects = self.iter_json_response(
+            url, params, parse=ProjectRecord.from_json, use_cache=False
+        )
+        for project in projects:
+            # Results are newest first, so the first project older than the cursor ends it.
+            if self._parse_timestamp(project.last_activity_at) <= cursor_time:
+                break
+            changes.append(project)
+        return changes
+
+    @staticmethod
+    def _parse_timestamp(value: str) -> datetime:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+    @staticmethod
+    def _format_timestamp(value: datetime) -> str:
+        return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def _load_project_snapshot(self) -> Optional[Dict[str, Any]]:
+        try:
+            snapshot = json.loads(self.snapshot_path.read_text())
+            records = (ProjectRecord(*entry) for entry in snapshot["projects"])
+            snapshot["projects"] = {record.id: record for record in records}
+            return snapshot
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save_project_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.snapshot_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(snapshot))
+        os.replace(tmp_path, self.snapshot_path)
 
-    def find_local_git_repos(self) -> Dict[str, Path]:
+    def find_local_git_repos(self, max_depth: Optional[int] = None) -> Dict[str, Path]:
         git_repos = {}
+        for repo_path in self.iter_local_repo_paths(max_depth):
+            relative_path = repo_path.relative_to(self.base_directory)
+            git_repos[str(relative_path)] = repo_path
+        return git_repos
+
+    def iter_local_repo_paths(self, max_depth: Optional[int] = None) -> Iterator[Path]:
+        self.local_namespaces = set()
         search_dirs = [self.group_directory]
         for search_dir in search_dirs:
             if not search_dir.is_dir():
                 logging.warning(f"Search directory does not exist: {search_dir}")
                 continue
-            for root, dirs, files in os.walk(search_dir):
-                root_path = Path(root)
-                if (root_path / ".git").is_dir():
-                    repo_path = root_path.resolve()
-                    relative_path = repo_path.relative_to(self.base_directory)
-                    git_repos[str(relative_path)] = repo_path
-                    dirs[:] = [d for d in dirs if d != ".git"]
-        return git_repos
+            # search_dir is resolved and symlinks are not followed, so the paths found
+            # below it are already canonical.
+            scanner = None
+            if self.use_index:
+                repos: Iterable[str] = self._refresh_repo_index(search_dir)
+            else:
+                scanner = GitRepoScanner(search_dir, max_depth, self.scan_workers)
+                repos = scanner.scan()
+            for repo in repos:
+                yield Path(repo)
+            if scanner is not None:
+                self.local_namespaces.update(scanner.namespaces)
+
+    def _open_repo_index(self, search_dir: Path) -> RepoIndex:
+        index_name = hashlib.sha256(str(search_dir).encode()).hexdigest()[:16]
+        return RepoIndex(
+            self.index_directory / f"{index_name}.sqlite", search_dir, self.scan_workers
+        )
+
+    def _refresh_repo_index(self, search_dir: Path) -> List[str]:
+        index = self._open_repo_index(search_dir)
+        try:
+            repos = index.refresh(rescan=self.rescan)
+            self.local_namespaces.update(index.namespaces())
+            return repos
+        finally:
+            index.close()
+
+    def watch_local_repositories(self) -> None:
+        if not self.use_index:
+            raise ValueError("--watch keeps the repository index, which --no_cache disables")
+        if not self.group_directory.is_dir():
+            raise ValueError(f"Search directory does not exist: {self.group_directory}")
+        logging.info(f"Watching repositories under {self.group_directory}...")
+        index = self._open_repo_index(self.group_directory)
+        try:
+            RepoIndexWatcher(index, self.watch_interval).run(rescan=self.rescan)
+        except KeyboardInterrupt:
+            logging.info("Watcher stopped.")
+        finally:
+            index.close()
+
+    def get_discovery_depth(
+        self, gitlab_repositories: Dict[str, ProjectRecord]
+    ) -> Optional[int]:
+        group_parts = self._group_depth()
+        if group_parts is None:
+            return None
+        depths = [len(Path(path).parts) - group_parts for path in gitlab_repositories]
+        if not depths:
+            return None
+        return max(depths) + DISCOVERY_DEPTH_MARGIN
 
     def delete_directories(self, directories: List[Path], description: str) -> None:
         if not directories:
@@ -267,76 +2531,249 @@ class GitLabRepoCleaner:
         else:
             logging.info(f"No {description} were deleted.")
 
-    def get_user_directories(self) -> List[Path]:
-        url = f"https://gitlab.com/api/v4/groups/{self.group_id}/members"
+    def get_user_directories(
+        self, usernames: Optional[Iterable[Optional[str]]] = None
+    ) -> List[Path]:
+        url = f"{self.group_api_url}/members"
+        user_directories = []
+        user_count = 0
         try:
-            users = self.get_json_response(url)
-            logging.info(f"Found {len(users)} users in the group.")
+            if usernames is None:
+                usernames = self._iter_member_usernames(url)
+            for username in usernames:
+                user_count += 1
+                if not username:
+                    continue
+                user_dir = self.base_directory / username
+                if user_dir.is_dir():
+                    user_directories.append(user_dir)
         except GitLabAPIError as e:
             logging.error(f"Failed to fetch group members: {e}")
             return []
-
-        user_directories = []
-        for user in users:
-            username = user.get("username")
-            if not username:
-                continue
-            user_dir = self.base_directory / username
-            if user_dir.is_dir():
-                user_directories.append(user_dir)
+        logging.info(f"Found {user_count} users in the group.")
         return user_directories
 
+    def _iter_member_usernames(self, url: str) -> Iterator[Optional[str]]:
+        if self.api_backend == "graphql":
+            try:
+                return iter(
+                    [
+                        (node.get("user") or {}).get("username")
+                        for node in self.iter_graphql_nodes(
+                            GRAPHQL_MEMBERS_QUERY, "groupMembers"
+                        )
+                    ]
+                )
+            except GitLabAPIError as e:
+                logging.warning(f"GraphQL member listing failed, falling back to REST: {e}")
+        return (user.get("username") for user in self.iter_json_response(url))
+
     def clone_group_repositories(self) -> None:
         logging.info("Cloning group repositories from GitLab...")
         cmd_clone_group = ["glab", "repo", "clone", "-g", self.group_id, "-p", "--paginate"]
-        try:
-            if not self.dry_run:
-                self.run_command(cmd_clone_group, cwd=self.base_directory)
-            else:
-                logging.info(f"[Dry Run] Executed command: {' '.join(cmd_clone_group)}")
-        except subprocess.CalledProcessError:
-            logging.error("Failed to clone group repositories.")
+        if self.dry_run:
+            logging.info(f"[Dry Run] Executed command: {' '.join(cmd_clone_group)}")
+            return
+        for attempt in range(self.command_retries + 1):
+            try:
+                self.run_command(cmd_clone_group, self.base_directory, self.clone_timeout)
+                return
+            except subprocess.TimeoutExpired:
+                if attempt < self.command_retries:
+                    logging.info("Retrying the group clone...")
+            except subprocess.CalledProcessError:
+                break
+        logging.error("Failed to clone group repositories.")
 
-    def fetch_gitlab_repositories(self) -> Dict[str, str]:
+    def fetch_gitlab_repositories(self) -> Dict[str, ProjectRecord]:
         gitlab_repositories = self.get_group_repositories()
         logging.info(
             f"Found {len(gitlab_repositories)} repositories in \
                 the group and subgroups on GitLab."
         )
+        self._store_project_metadata(gitlab_repositories)
         return gitlab_repositories
 
-    def map_gitlab_repos_to_absolute_paths(
-        self, gitlab_repositories: Dict[str, str]
-    ) -> Set[Path]:
-        return {
-            (self.base_directory / Path(path)).resolve() for path in gitlab_repositories.keys()
-        }
+    def _store_project_metadata(self, gitlab_repositories: Dict[str, ProjectRecord]) -> None:
+        base = str(self.base_directory)
+        projects = [
+            (
+                os.path.normpath(os.path.join(base, path)),
+                project.default_branch,
+                project.last_activity_at,
+            )
+            for path, project in gitlab_repositories.items()
+        ]
+        self._set_project_metadata(projects)
+        # Cached in the index so a later --update without an API call can use them too.
+        if self.use_index and self.group_directory.is_dir():
+            index = self._open_repo_index(self.group_directory)
+            try:
+                index.store_projects(projects)
+            finally:
+                index.close()
+
+    def _load_project_metadata(self) -> None:
+        if self.use_index and self.group_directory.is_dir():
+            index = self._open_repo_index(self.group_directory)
+            try:
+                projects = index.projects()
+            finally:
+                index.close()
+            self._set_project_metadata(
+                (path, branch, activity) for path, (branch, activity) in projects.items()
+            )
+            logging.info(f"Default branches of {len(self.default_branches)} projects cached.")
+
+    def _set_project_metadata(
+        self, projects: Iterable[Tuple[str, Optional[str], Optional[str]]]
+    ) -> None:
+        self.default_branches, self.last_activity_at = {}, {}
+        for path, default_branch, last_activity_at in projects:
+            if default_branch:
+                self.default_branches[path] = default_branch
+            if last_activity_at:
+                self.last_activity_at[path] = last_activity_at
+
+    def _group_depth(self) -> Optional[int]:
+        try:
+            return len(self.group_directory.relative_to(self.base_directory).parts)
+        except ValueError:
+            return None
+
+    def _orphan_root(self, remote: NamespaceTrie, parts: List[str]) -> Optional[int]:
+        # Length of the shortest prefix of parts that names a directory unknown to GitLab
+        # strictly below the group directory, i.e. the root of a removed subgroup.
+        group_depth = self._group_depth()
+        depth, _ = remote.match(parts)
+        if group_depth is None or depth < group_depth or depth >= len(parts):
+            return None
+        return depth + 1
+
+    @staticmethod
+    def _holds_only_namespaces(directory: Path, allow_repos: bool) -> bool:
+        # True when the tree below directory is made of directories only, without entering
+        # repositories; a stray file (or, unless allowed, repository) keeps it.
+        stack = [str(directory)]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if not entry.is_dir(follow_symlinks=False):
+                            return False
+                        if GitRepoScanner.is_repo_root(entry.path):
+                            if not allow_repos:
+                                return False
+                        else:
+                            stack.append(entry.path)
+            except OSError:
+                return False
+        return True
 
     def identify_repos_to_delete(
-        self, local_git_repos: Dict[str, Path], gitlab_repo_absolute_paths: Set[Path]
+        self, local_git_repos: Dict[str, Path], gitlab_repositories: Dict[str, ProjectRecord]
     ) -> List[Path]:
-        repos_to_delete = [
-            full_path
-            for relative_path, full_path in local_git_repos.items()
-            if full_path not in gitlab_repo_absolute_paths
-        ]
-        for repo in repos_to_delete:
-            logging.info(f"Repository to delete: {repo} (not found on GitLab)")
+        remote = NamespaceTrie.from_paths(gitlab_repositories)
+        orphans: Dict[Path, List[Path]] = {}
+        for relative_path, full_path in local_git_repos.items():
+            parts = NamespaceTrie.split(relative_path)
+            depth, node = remote.match(parts)
+            if node is not None and node.is_project:
+                continue
+            root_length = self._orphan_root(remote, parts)
+            if root_length is not None and root_length < len(parts):
+                target = self.base_directory.joinpath(*parts[:root_length])
+            else:
+                target = full_path
+            orphans.setdefault(target, []).append(full_path)
+
+        repos_to_delete = []
+        for target, repos in sorted(orphans.items()):
+            if repos == [target]:
+                logging.info(f"Repository to delete: {target} (not found on GitLab)")
+                repos_to_delete.append(target)
+            elif self._holds_only_namespaces(target, allow_repos=True):
+                logging.info(
+                    f"Subgroup to delete: {target} ({len(repos)} repositories, "
+                    "not found on GitLab)"
+                )
+                repos_to_delete.append(target)
+            else:
+                # Other files live in the namespace, so only its repositories go.
+                for repo in sorted(repos):
+                    logging.info(f"Repository to delete: {repo} (not found on GitLab)")
+                repos_to_delete.extend(sorted(repos))
         return repos_to_delete
 
+    def identify_empty_namespaces(
+        self, gitlab_repositories: Dict[str, ProjectRecord], repos_to_delete: List[Path]
+    ) -> List[Path]:
+        # Namespace directories GitLab does not know that hold nothing but empty directories,
+        # e.g. left behind when their repositories were deleted one by one.
+        remote = NamespaceTrie.from_paths(gitlab_repositories)
+        covered = {str(path) for path in repos_to_delete}
+        candidates = set()
+        for namespace in self.local_namespaces:
+            parts = NamespaceTrie.split(os.path.relpath(namespace, self.base_directory))
+            root_length = self._orphan_root(remote, parts)
+            if root_length is not None:
+                candidates.add(self.base_directory.joinpath(*parts[:root_length]))
+        empty_namespaces = [
+            namespace
+            for namespace in sorted(candidates)
+            if str(namespace) not in covered and self._holds_only_namespaces(namespace, False)
+        ]
+        for namespace in empty_namespaces:
+            logging.info(f"Empty namespace directory to delete: {namespace}")
+        return empty_namespaces
+
+    def get_member_usernames(self) -> Optional[List[Optional[str]]]:
+        url = f"{self.group_api_url}/members"
+        try:
+            return list(self._iter_member_usernames(url))
+        except GitLabAPIError as e:
+            logging.error(f"Failed to fetch group members: {e}")
+            return None
+
+    async def _fetch_remote_state(
+        self,
+    ) -> Tuple[Dict[str, ProjectRecord], Optional[List[Optional[str]]]]:
+        # requests is blocking, so every call runs in a worker thread; the scheduler's
+        # in-flight limit and the pooled keep-alive session are shared by all of them.
+        try:
+            _, gitlab_repositories, usernames = await asyncio.gather(
+                asyncio.to_thread(self.clone_group_repositories),
+                asyncio.to_thread(self.fetch_gitlab_repositories),
+                asyncio.to_thread(self.get_member_usernames),
+            )
+        except (asyncio.CancelledError, KeyboardInterrupt):
+            # Ctrl-C cancels this task, but asyncio.run then joins the worker threads; the
+            # glab clone would hold that up until it finished or hit --clone_timeout.
+            self.engine.cancel_all()
+            raise
+        return gitlab_repositories, usernames
+
     def get_repositories(self) -> None:
-        self.clone_group_repositories()
-        gitlab_repositories = self.fetch_gitlab_repositories()
-        local_git_repos = self.find_local_git_repos()
+        usernames: Optional[List[Optional[str]]] = None
+        if self.async_api:
+            gitlab_repositories, usernames = asyncio.run(self._fetch_remote_state())
+        else:
+            self.clone_group_repositories()
+            gitlab_repositories = self.fetch_gitlab_repositories()
+        local_git_repos = self.find_local_git_repos(
+            max_depth=self.get_discovery_depth(gitlab_repositories)
+        )
         logging.info(
             f"Found {len(local_git_repos)} local Git repositories in the group directory."
         )
-        gitlab_repo_absolute_paths = self.map_gitlab_repos_to_absolute_paths(gitlab_repositories)
-        repos_to_delete = self.identify_repos_to_delete(
-            local_git_repos, gitlab_repo_absolute_paths
-        )
+        repos_to_delete = self.identify_repos_to_delete(local_git_repos, gitlab_repositories)
         self.delete_directories(repos_to_delete, "repositories")
-        user_directories = self.get_user_directories()
+        empty_namespaces = self.identify_empty_namespaces(gitlab_repositories, repos_to_delete)
+        self.delete_directories(empty_namespaces, "empty namespace directories")
+        if self.async_api and usernames is None:
+            user_directories = []
+        else:
+            user_directories = self.get_user_directories(usernames)
         self.delete_directories(user_directories, "user directories")
         if self.include_directories:
             self.delete_directories(self.include_directories, "additional directories")
@@ -352,16 +2789,48 @@ def main() -> None:
         include_directories=args.include_directories,
         force=args.force,
         dry_run=args.dry_run,
+        api_workers=args.api_workers,
+        rate_limit=args.rate_limit,
+        max_retries=args.max_retries,
+        use_cache=not args.no_cache,
+        cache_directory=args.cache_dir,
+        cache_ttl=args.cache_ttl,
+        incremental=args.incremental,
+        full_sync_interval=args.full_sync_interval,
+        exclude_archived=args.exclude_archived,
+        api_backend=args.api_backend,
+        async_api=args.async_api,
+        max_in_flight=args.max_in_flight,
+        gitlab_url=args.gitlab_url,
+        rescan=args.rescan,
+        scan_workers=args.scan_workers,
+        update_source=args.update_source,
+        watch_interval=args.watch_interval,
+        jobs=args.jobs,
+        update_strategy=args.update_strategy,
+        skip_unchanged=args.skip_unchanged,
+        fetch_timeout=args.fetch_timeout,
+        clone_timeout=args.clone_timeout,
+        stall_timeout=args.stall_timeout,
+        command_retries=args.command_retries,
+        schedule=args.schedule,
+        max_jobs=args.max_jobs,
     )
     logging.info(f"Base directory: {manager.base_directory}")
     logging.info(f"Group directory: {manager.group_directory}")
     logging.info(f"Force delete: {'Enabled' if manager.force else 'Disabled'}")
     logging.info(f"Dry run: {'Enabled' if manager.dry_run else 'Disabled'}")
+    logging.info(f"API cache: {manager.cache.directory if manager.cache else 'Disabled'}")
     try:
-        if args.update:
+        if args.watch:
+            manager.watch_local_repositories()
+        elif args.update:
             manager.update_git_repositories()
         else:
             manager.get_repositories()
+    except KeyboardInterrupt:
+        manager.engine.cancel_all()
+        logging.error("Interrupted; running commands were stopped.")
     except Exception as e:
         logging.error(f"Process failed: {e}")
 